@@ -1,10 +1,52 @@
+import asyncio
 import logging
 import json
-import aiohttp
-from config import YANDEX_API_KEY, YANDEX_FOLDER_ID
+from typing import List, Optional
+from config import (
+    YANDEX_API_KEY, YANDEX_FOLDER_ID, DESCRIPTION_CONCURRENCY, DESCRIPTION_FORCE_REFRESH,
+    DESCRIPTION_BATCH_SIZE, DESCRIPTION_BATCH_MAX_TOKENS, DESCRIPTION_TOKENS_PER_ITEM,
+)
+from description_cache import description_cache
+from resilience import YandexError, yandex_gpt
+from scheduler import priority
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DESCRIPTION = "Премиальный корейский уход. Работает с первого применения. 🌸✨"
+ERROR_DESCRIPTION = "Эффективный корейский уход. Проверено в Сеуле. 🌟💎"
+# Заглушки при сбое генерации: в кэш описаний не попадают
+FALLBACK_DESCRIPTIONS = {DEFAULT_DESCRIPTION, ERROR_DESCRIPTION}
+
+# Требования к описанию: общие для одиночной и пакетной генерации
+DESCRIPTION_GUIDE = """
+📌 Цель: читатель должен захотеть купить, потому что ПОНЯЛ, ЧТО ЭТО РАБОТАЕТ.
+
+👉 Структура:
+1. 💫 **Вступление с эффектом**:
+   - Какой результат даёт продукт? (сияние, упругость, сияющий финиш и т.д.)
+   - Какие проблемы решает? (морщинки, тусклость, обезвоженность)
+
+2. 🌿 **Ключевые ингредиенты и технологии**:
+   - Какие активные компоненты? (гиалуроновая кислота, ниацинамид, пептиды, центелла азиатская, аденозин, экстракт слизи улитки и т.д.)
+   - Есть ли фирменный комплекс бренда? (например, "GinsenCell" у Sulwhasoo, "Cica" у Dr.Jart+)
+   - Как они работают? (например: "Ниацинамид — осветляет пигментные пятна", "Гиалурон — удерживает влагу")
+
+3. ✨ **Ощущение и текстура**:
+   - Лёгкий гель, насыщенный крем, шелковая сыворотка?
+   - Как ведёт себя на коже? (впитывается мгновенно, не липнет, не оставляет плёнки)
+
+4. 📦 **Упаковка**:
+   - Только 1–2 предложения: цвет, стиль, практичность. Не больше.
+
+5. 💬 **Завершение с вовлечением**:
+   - Призыв к ощущению: "Представьте утро после первого применения…"
+   - Эмодзи: 🌸✨💫💎🤍💗
+
+📌 Формат: 3–4 абзаца, на русском, с переносами строк, живым языком.
+📌 Не пиши: "фото недоступно", "цена", "закажите сейчас"
+""".strip()
+DESCRIPTION_SYSTEM = "Ты — эксперт по корейской косметике. Описание должно вызывать желание попробовать."
+
 
 async def translate_korean_to_english(text: str) -> str:
     """
@@ -24,26 +66,60 @@ async def translate_korean_to_english(text: str) -> str:
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-                headers=headers,
-                json=payload
-            ) as resp:
-                if resp.status == 200:
-                    result = await resp.json()
-                    translation = result["result"]["alternatives"][0]["message"]["text"].strip()
-                    if translation.startswith('"') and translation.endswith('"'):
-                        translation = translation[1:-1]
-                    return translation
-                else:
-                    logger.error(f"❌ Ошибка перевода: {resp.status}")
-                    return text
+        result = await yandex_gpt.post(lambda: {"headers": headers, "json": payload})
+        translation = result["result"]["alternatives"][0]["message"]["text"].strip()
+        if translation.startswith('"') and translation.endswith('"'):
+            translation = translation[1:-1]
+        return translation
+    except YandexError as e:
+        logger.error(f"❌ Ошибка перевода: {e.status}")
+        return text
     except Exception as e:
         logger.error(f"❌ Исключение при переводе: {e}")
         return text
 
 
+async def translate_batch_yandex(texts: list) -> List[Optional[str]]:
+    """
+    Перевод нескольких корейских названий одним запросом: модель возвращает
+    JSON-объект {номер: перевод}. None — строка, пропущенная моделью, или сбой запроса.
+    """
+    numbered = {str(index + 1): text for index, text in enumerate(texts)}
+    headers = {"Authorization": f"Api-Key {YANDEX_API_KEY}", "Content-Type": "application/json"}
+    payload = {
+        "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt/latest",
+        "completionOptions": {"temperature": 0.3, "maxTokens": min(8000, 60 * len(texts) + 100)},
+        "messages": [
+            {"role": "system", "text": (
+                "Ты — профессиональный переводчик с корейского на английский. Переведи каждое "
+                "название товара точно, без пояснений. Ответ — только JSON-объект {\"номер\": \"перевод\"}."
+            )},
+            {"role": "user", "text": json.dumps(numbered, ensure_ascii=False)}
+        ]
+    }
+
+    try:
+        result = await yandex_gpt.post(lambda: {"headers": headers, "json": payload})
+        content = result["result"]["alternatives"][0]["message"]["text"].strip()
+        start, end = content.find('{'), content.rfind('}') + 1
+        if start == -1:
+            logger.error("❌ Пакет переводов: JSON не найден")
+            return [None] * len(texts)
+        data = json.loads(content[start:end])
+    except YandexError as e:
+        logger.error(f"❌ Ошибка перевода (пакет): {e.status}")
+        return [None] * len(texts)
+    except Exception as e:
+        logger.error(f"❌ Исключение при пакетном переводе: {e}")
+        return [None] * len(texts)
+
+    translations = []
+    for key in numbered:
+        translation = data.get(key)
+        translations.append(translation.strip().strip('"') if isinstance(translation, str) and translation.strip() else None)
+    return translations
+
+
 async def generate_description_yandex(brand: str, product: str, volume: str = "") -> str:
     """
     Генерирует подробное, продающее описание товара с акцентом на действии, составе и эффекте.
@@ -59,63 +135,209 @@ async def generate_description_yandex(brand: str, product: str, volume: str = ""
 Ты — топовый копирайтер премиального корейского бренда. Напиши яркое, эмоциональное, продающее описание для:
 {full_name}
 
-📌 Цель: читатель должен захотеть купить, потому что ПОНЯЛ, ЧТО ЭТО РАБОТАЕТ.
+{DESCRIPTION_GUIDE}
+"""
 
-👉 Структура:
-1. 💫 **Вступление с эффектом**:
-   - Какой результат даёт продукт? (сияние, упругость, сияющий финиш и т.д.)
-   - Какие проблемы решает? (морщинки, тусклость, обезвоженность)
+    payload = {
+        "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt/latest",
+        "completionOptions": {
+            "temperature": 0.7,
+            "maxTokens": 2000
+        },
+        "messages": [
+            {"role": "system", "text": DESCRIPTION_SYSTEM},
+            {"role": "user", "text": prompt}
+        ]
+    }
 
-2. 🌿 **Ключевые ингредиенты и технологии**:
-   - Какие активные компоненты? (гиалуроновая кислота, ниацинамид, пептиды, центелла азиатская, аденозин, экстракт слизи улитки и т.д.)
-   - Есть ли фирменный комплекс бренда? (например, "GinsenCell" у Sulwhasoo, "Cica" у Dr.Jart+)
-   - Как они работают? (например: "Ниацинамид — осветляет пигментные пятна", "Гиалурон — удерживает влагу")
+    try:
+        result = await yandex_gpt.post(lambda: {"headers": headers, "json": payload})
+        description = result["result"]["alternatives"][0]["message"]["text"].strip()
+        description = "\n".join(line.strip() for line in description.splitlines() if line.strip())
 
-3. ✨ **Ощущение и текстура**:
-   - Лёгкий гель, насыщенный крем, шелковая сыворотка?
-   - Как ведёт себя на коже? (впитывается мгновенно, не липнет, не оставляет плёнки)
+        logger.info(f"✅ Описание сгенерировано для: {full_name}")
+        return description
+    except YandexError as e:
+        logger.error(f"❌ Ошибка YandexGPT: {e.status}")
+        return DEFAULT_DESCRIPTION
+    except Exception as e:
+        logger.error(f"❌ Ошибка при генерации описания: {e}")
+        return ERROR_DESCRIPTION
 
-4. 📦 **Упаковка**:
-   - Только 1–2 предложения: цвет, стиль, практичность. Не больше.
 
-5. 💬 **Завершение с вовлечением**:
-   - Призыв к ощущению: "Представьте утро после первого применения…"
-   - Эмодзи: 🌸✨💫💎🤍💗
+async def generate_descriptions(
+    items: list,
+    concurrency: int = DESCRIPTION_CONCURRENCY,
+    force_refresh: bool = DESCRIPTION_FORCE_REFRESH,
+) -> list:
+    """
+    Генерирует описания для списка товаров (dict с brand/product/volume)
+    параллельно, не более concurrency запросов одновременно.
+    Сначала смотрит кэш описаний (description_cache.py): товар, описанный раньше
+    в любом объёме, обходится без GPT; варианты одного товара в items
+    генерируются один раз. force_refresh — игнорировать кэш и перезаписать его.
+    Порядок результатов совпадает с items; при сбое — DEFAULT_DESCRIPTION.
+    Массовая генерация идёт с приоритетом backfill и уступает распознаванию каталогов.
+    """
+    keys = [description_cache.key_for(item) for item in items]
+    cached = {} if force_refresh else await description_cache.get_many(keys)
 
-📌 Формат: 3–4 абзаца, на русском, с переносами строк, живым языком.
-📌 Не пиши: "фото недоступно", "цена", "закажите сейчас"
-"""
+    # Один запрос на ключ: первый товар с таким ключом представляет все варианты
+    pending = {}
+    for key, item in zip(keys, items):
+        if key not in cached and key not in pending:
+            pending[key] = item
+    if items:
+        logger.info(f"📝 Описания: из кэша {len(items) - len(pending)}, генерируем {len(pending)}")
+
+    with priority("backfill"):
+        generated = await _generate_uncached(list(pending.values()), concurrency)
+    fresh = {
+        key: description
+        for key, description in zip(pending, generated)
+        if description not in FALLBACK_DESCRIPTIONS
+    }
+    await description_cache.put_many(fresh)
+
+    by_key = {**cached, **dict(zip(pending, generated))}
+    return [by_key[key] for key in keys]
 
+
+async def generate_descriptions_batch(items: list) -> List[Optional[str]]:
+    """
+    Описания нескольких товаров одним запросом: инструкция передаётся один раз,
+    модель возвращает JSON-объект {артикул: описание}. Порядок совпадает с items;
+    None — товар, который модель пропустила (или весь запрос не удался).
+    """
+    keys = [item.get("article") or str(index + 1) for index, item in enumerate(items)]
+    products = [{"id": key, "name": _full_name(item)} for key, item in zip(keys, items)]
+
+    headers = {"Authorization": f"Api-Key {YANDEX_API_KEY}", "Content-Type": "application/json"}
+    prompt = (
+        "Ты — топовый копирайтер премиального корейского бренда. "
+        "Напиши яркое, эмоциональное, продающее описание для КАЖДОГО товара из списка.\n\n"
+        f"{DESCRIPTION_GUIDE}\n\n"
+        f"Товары (JSON):\n{json.dumps(products, ensure_ascii=False)}\n\n"
+        'Ответ — только JSON-объект {"id товара": "описание"} со всеми товарами, '
+        "абзацы внутри описания разделяй символом \\n."
+    )
     payload = {
         "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt/latest",
         "completionOptions": {
             "temperature": 0.7,
-            "maxTokens": 2000
+            "maxTokens": min(DESCRIPTION_BATCH_MAX_TOKENS, DESCRIPTION_TOKENS_PER_ITEM * len(items) + 200)
         },
         "messages": [
-            {"role": "system", "text": "Ты — эксперт по корейской косметике. Описание должно вызывать желание попробовать."},
+            {"role": "system", "text": DESCRIPTION_SYSTEM},
             {"role": "user", "text": prompt}
         ]
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-                headers=headers,
-                json=payload
-            ) as resp:
-                if resp.status != 200:
-                    logger.error(f"❌ Ошибка YandexGPT: {resp.status}")
-                    return "Премиальный корейский уход. Работает с первого применения. 🌸✨"
-
-                result = await resp.json()
-                description = result["result"]["alternatives"][0]["message"]["text"].strip()
-                description = "\n".join(line.strip() for line in description.splitlines() if line.strip())
-
-                logger.info(f"✅ Описание сгенерировано для: {full_name}")
-                return description
-
+        result = await yandex_gpt.post(lambda: {"headers": headers, "json": payload})
+        content = result["result"]["alternatives"][0]["message"]["text"].strip()
+        start = content.find('{')
+        if start == -1:
+            logger.error("❌ Пакет описаний: JSON не найден")
+            return [None] * len(items)
+        data = _parse_json_object(content[start:])
+    except YandexError as e:
+        logger.error(f"❌ Ошибка YandexGPT (пакет описаний): {e.status}")
+        return [None] * len(items)
     except Exception as e:
-        logger.error(f"❌ Ошибка при генерации описания: {e}")
-        return "Эффективный корейский уход. Проверено в Сеуле. 🌟💎"
\ No newline at end of file
+        logger.error(f"❌ Ошибка при генерации пакета описаний: {e}")
+        return [None] * len(items)
+
+    descriptions = []
+    for key in keys:
+        description = data.get(key)
+        if isinstance(description, str) and description.strip():
+            description = "\n".join(line.strip() for line in description.splitlines() if line.strip())
+        else:
+            description = None
+        descriptions.append(description)
+    logger.info(f"✅ Пакет описаний: {sum(d is not None for d in descriptions)} из {len(items)}")
+    return descriptions
+
+
+def _parse_json_object(text: str) -> dict:
+    """
+    JSON-объект из ответа модели. Переносы строк внутри строк допускаются (strict=False):
+    модель часто пишет абзацы описания как есть, а не \\n. Если объект оборван или
+    испорчен в середине, возвращаются пары, разобранные до места ошибки.
+    """
+    decoder = json.JSONDecoder(strict=False)
+    try:
+        data, _ = decoder.raw_decode(text)
+        if isinstance(data, dict):
+            return data
+    except ValueError:
+        pass
+
+    data, pos = {}, 1  # text[0] == "{"
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        try:
+            key, pos = decoder.raw_decode(text, pos)
+            while pos < len(text) and text[pos] in " \t\r\n":
+                pos += 1
+            if not isinstance(key, str) or text[pos:pos + 1] != ":":
+                break
+            pos += 1
+            while pos < len(text) and text[pos] in " \t\r\n":
+                pos += 1
+            value, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break
+        data[key] = value
+    if data:
+        logger.warning(f"⚠️ Пакет описаний: JSON разобран частично ({len(data)} товаров)")
+    return data
+
+
+def _full_name(item: dict) -> str:
+    full_name = f"{item['brand']} {item['product']}".strip()
+    if description_cache.by_volume and item.get("volume"):
+        full_name += f" {item['volume']}"
+    return full_name
+
+
+async def _generate_uncached(items: list, concurrency: int) -> list:
+    """
+    Пакеты по DESCRIPTION_BATCH_SIZE товаров (меньше, если описания не уместятся
+    в DESCRIPTION_BATCH_MAX_TOKENS); пропущенные моделью товары — по одному.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    size = max(1, min(DESCRIPTION_BATCH_SIZE, DESCRIPTION_BATCH_MAX_TOKENS // DESCRIPTION_TOKENS_PER_ITEM))
+
+    async def describe(item: dict) -> str:
+        async with semaphore:
+            # Описание общее для всех объёмов, поэтому объём в промпт не передаём
+            return await generate_description_yandex(
+                brand=item["brand"],
+                product=item["product"],
+                volume=item.get("volume", "") if description_cache.by_volume else ""
+            )
+
+    async def describe_batch(batch: list) -> list:
+        if len(batch) == 1:
+            return [await describe(batch[0])]
+        async with semaphore:
+            descriptions = await generate_descriptions_batch(batch)
+        missing = [index for index, description in enumerate(descriptions) if description is None]
+        if missing:
+            logger.info(f"↩️ Пакет описаний: {len(missing)} товаров генерируем по одному")
+            for index, description in zip(missing, await asyncio.gather(*(describe(batch[i]) for i in missing))):
+                descriptions[index] = description
+        return descriptions
+
+    batches = [items[i:i + size] for i in range(0, len(items), size)]
+    results = await asyncio.gather(*(describe_batch(batch) for batch in batches), return_exceptions=True)
+    descriptions = []
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            logger.error(f"❌ Описания не сгенерированы для пакета из {len(batch)} товаров: {result}")
+            result = [DEFAULT_DESCRIPTION] * len(batch)
+        descriptions.extend(result)
+    return descriptions
\ No newline at end of file
@@ -1,6 +1,8 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, make_response
 from flask_cors import CORS
+from functools import lru_cache
 import os
+import re
 import json
 
 app = Flask(__name__)
@@ -10,6 +12,11 @@ CORS(app)
 SESSIONS_DIR = os.path.join(os.path.dirname(__file__), "sessions")
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
+# 🔹 Снапшоты каталога публикует бот (catalog_snapshot.py); имя файла = хэш содержимого
+SNAPSHOTS_DIR = os.path.join(os.path.dirname(__file__), "snapshots")
+SNAPSHOT_ID_RE = re.compile(r"[0-9a-f]{20}")
+SNAPSHOT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 @app.route('/api/save', methods=['POST'])
 def save_session():
     data = request.json
@@ -49,6 +56,33 @@ def get_products():
         print(f"❌ Ошибка чтения: {e}")
         return jsonify([])
 
+@lru_cache(maxsize=32)
+def _read_snapshot(snapshot_id):
+    filepath = os.path.join(SNAPSHOTS_DIR, f"{snapshot_id}.json")
+    with open(filepath, "rb") as f:
+        return f.read()
+
+@app.route('/api/catalog/<snapshot_id>', methods=['GET'])
+def get_catalog_snapshot(snapshot_id):
+    if not SNAPSHOT_ID_RE.fullmatch(snapshot_id):
+        return jsonify({"error": "invalid snapshot id"}), 400
+
+    # Снапшот неизменяем: ETag = id, клиент может кэшировать его бессрочно
+    etag = f'"{snapshot_id}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = make_response("", 304)
+    else:
+        try:
+            body = _read_snapshot(snapshot_id)
+        except FileNotFoundError:
+            return jsonify({"error": "snapshot not found"}), 404
+        response = make_response(body)
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = SNAPSHOT_CACHE_CONTROL
+    return response
+
 @app.route('/')
 def index():
     return "Mini App API is running."
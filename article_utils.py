@@ -0,0 +1,37 @@
+import hashlib
+import re
+import unicodedata
+
+ARTICLE_PREFIX = "AP"
+
+
+def normalize_text(text) -> str:
+    """Нижний регистр, NFKC, без пунктуации и лишних пробелов: "Jinsul  Cream!" → "jinsul cream" """
+    text = unicodedata.normalize("NFKC", str(text or "")).lower()
+    text = re.sub(r"[^\w+]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def normalize_volume(volume) -> str:
+    """ "60 ML" / "60ml" / "60m1" (ошибка OCR) → "60ml" """
+    volume = normalize_text(volume).replace(" ", "")
+    return re.sub(r"m1\b", "ml", volume)
+
+
+def product_fingerprint(item: dict) -> str:
+    """Отпечаток товара: бренд, название, объём и признак рефилла после нормализации"""
+    return "|".join((
+        normalize_text(item.get("brand")),
+        normalize_text(item.get("product")),
+        normalize_volume(item.get("volume")),
+        "refill" if item.get("refill") else "",
+    ))
+
+
+def make_article(item: dict) -> str:
+    """
+    Стабильный артикул из содержимого: один и тот же товар в любом каталоге и при
+    любой повторной загрузке получает тот же артикул, например AP-3F9A1C07.
+    """
+    digest = hashlib.sha1(product_fingerprint(item).encode("utf-8")).hexdigest()
+    return f"{ARTICLE_PREFIX}-{digest[:8].upper()}"
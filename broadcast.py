@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+import logging
+from typing import Dict
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+import repository
+from config import BROADCAST_CONCURRENCY, BROADCAST_PAGE_SIZE, BROADCAST_PER_CHAT_RATE, BROADCAST_RATE
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_TEMPLATES = {
+    "new_catalog": "🌸 Вышел новый каталог! Откройте /catalog и выбирайте 💫",
+    "closing": "⏳ Закупка скоро закрывается — успейте оформить заказ: /catalog",
+}
+
+MAX_ATTEMPTS = 5
+
+
+class Broadcaster:
+    """
+    Рассылка сообщений всем активным пользователям.
+    Получатели читаются из БД страницами по курсору users.id; курсор и счётчики
+    сохраняются после каждой страницы, поэтому после рестарта рассылка
+    продолжается с места остановки (повторно может уйти не более одной страницы).
+    Сообщения страницы отправляются параллельно (не больше concurrency сразу),
+    скорость ограничивает общий token bucket.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, per_chat_rate: float = BROADCAST_PER_CHAT_RATE,
+                 concurrency: int = BROADCAST_CONCURRENCY):
+        self.bucket = TokenBucket(rate)
+        self.per_chat_rate = per_chat_rate
+        self.concurrency = max(1, concurrency)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._bot = None
+
+    async def start(self, bot):
+        self._bot = bot
+        for broadcast_id in await repository.list_running_broadcast_ids():
+            logger.info(f"🔁 Возобновляем рассылку #{broadcast_id}")
+            self._spawn(broadcast_id)
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    async def create(self, text: str, admin_chat_id: int) -> int:
+        broadcast = await repository.create_broadcast(text=text, admin_chat_id=admin_chat_id, status="running")
+        self._spawn(broadcast.id)
+        return broadcast.id
+
+    # --- ВНУТРЕННЕЕ ---
+    def _spawn(self, broadcast_id: int):
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def _run(self, broadcast_id: int):
+        broadcast = await repository.get_broadcast(broadcast_id)
+        if broadcast is None:
+            return
+        cursor, sent, failed = broadcast.last_user_id or 0, broadcast.sent or 0, broadcast.failed or 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id: int) -> bool:
+            async with semaphore:
+                return await self._deliver(chat_id, broadcast.text)
+
+        while True:
+            page = await repository.list_active_recipients(cursor, BROADCAST_PAGE_SIZE)
+            if not page:
+                break
+            # Курсор сдвигается только когда вся страница завершена
+            delivered = await asyncio.gather(*(deliver(chat_id) for _, chat_id in page))
+            sent += sum(delivered)
+            failed += len(delivered) - sum(delivered)
+            cursor = page[-1][0]
+            await repository.update_broadcast(broadcast_id, last_user_id=cursor, sent=sent, failed=failed)
+
+        await repository.update_broadcast(broadcast_id, status="done", finished_at=datetime.datetime.now())
+        logger.info(f"✅ Рассылка #{broadcast_id} завершена: доставлено {sent}, ошибок {failed}")
+        if broadcast.admin_chat_id:
+            try:
+                await self._bot.send_message(
+                    broadcast.admin_chat_id,
+                    f"📣 Рассылка #{broadcast_id} завершена\nДоставлено: {sent}\nОшибок: {failed}"
+                )
+            except TelegramError as e:
+                logger.warning(f"⚠️ Не удалось отправить итог рассылки: {e}")
+
+    async def _deliver(self, chat_id: int, text: str) -> bool:
+        for attempt in range(MAX_ATTEMPTS):
+            await self._chat_bucket(chat_id).acquire()
+            await self.bucket.acquire()
+            try:
+                await self._bot.send_message(chat_id, text)
+                return True
+            except RetryAfter as e:
+                # 429: останавливаем всю рассылку на указанное Telegram время
+                retry_after = getattr(e.retry_after, "total_seconds", lambda: e.retry_after)()
+                logger.warning(f"⚠️ Flood limit, пауза {retry_after} с")
+                self.bucket.pause(float(retry_after))
+            except Forbidden:
+                # Пользователь заблокировал бота — больше ему не пишем
+                await repository.update_user(chat_id, is_active=False)
+                return False
+            except BadRequest as e:
+                logger.warning(f"⚠️ Сообщение не доставлено ({chat_id}): {e}")
+                return False
+            except NetworkError as e:
+                logger.warning(f"⚠️ Сетевая ошибка при рассылке ({chat_id}): {e}")
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                logger.warning(f"⚠️ Сообщение не доставлено ({chat_id}): {e}")
+                return False
+        return False
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= 10_000:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.idle()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+        return bucket
+
+
+broadcaster = Broadcaster()
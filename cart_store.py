@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import repository
+from config import CART_FLUSH_INTERVAL, CART_IDLE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class CartStore:
+    """
+    Корзины пользователей: article → (quantity, price) в памяти, SQLite — источник истины.
+    Изменения копятся в _dirty и сбрасываются в БД пачкой (write-behind),
+    неактивные корзины выгружаются из памяти и подгружаются при следующем обращении.
+    """
+
+    def __init__(self, flush_interval: float = CART_FLUSH_INTERVAL, idle_ttl: float = CART_IDLE_TTL):
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self._carts: Dict[int, Dict[str, Tuple[int, int]]] = {}
+        self._last_access: Dict[int, float] = {}
+        self._dirty = set()
+        self._task: Optional[asyncio.Task] = None
+
+    # --- ЧТЕНИЕ ---
+    async def items(self, user_id: int) -> List[Tuple[str, int, int]]:
+        """Позиции корзины: (article, quantity, price)"""
+        cart = await self._get(user_id)
+        return [(article, qty, price) for article, (qty, price) in cart.items()]
+
+    async def contains(self, user_id: int, article: str) -> bool:
+        return article in await self._get(user_id)
+
+    # --- ИЗМЕНЕНИЕ ---
+    async def add(self, user_id: int, article: str, price: int, quantity: int = 1) -> bool:
+        """Добавляет товар. False — если он уже в корзине"""
+        cart = await self._get(user_id)
+        if article in cart:
+            return False
+        cart[article] = (quantity, price)
+        self._dirty.add(user_id)
+        return True
+
+    async def set_quantity(self, user_id: int, article: str, quantity: int) -> None:
+        cart = await self._get(user_id)
+        if article not in cart:
+            return
+        if quantity <= 0:
+            del cart[article]
+        else:
+            cart[article] = (quantity, cart[article][1])
+        self._dirty.add(user_id)
+
+    async def remove(self, user_id: int, article: str) -> None:
+        await self.set_quantity(user_id, article, 0)
+
+    async def clear(self, user_id: int) -> None:
+        cart = await self._get(user_id)
+        if cart:
+            cart.clear()
+            self._dirty.add(user_id)
+
+    # --- ФОНОВАЯ СИНХРОНИЗАЦИЯ ---
+    async def flush(self) -> int:
+        """Сбрасывает изменённые корзины в SQLite одной транзакцией"""
+        if not self._dirty:
+            return 0
+        users, self._dirty = self._dirty, set()
+        snapshot = {
+            user_id: [(a, q, p) for a, (q, p) in self._carts.get(user_id, {}).items()]
+            for user_id in users
+        }
+        try:
+            await repository.save_carts(snapshot)
+        except Exception as e:
+            logger.error(f"❌ Не удалось сохранить корзины: {e}")
+            self._dirty |= users
+            return 0
+        return len(snapshot)
+
+    def evict_idle(self) -> int:
+        """Выгружает из памяти сохранённые корзины, к которым давно не обращались"""
+        deadline = time.monotonic() - self.idle_ttl
+        idle = [
+            user_id for user_id, ts in self._last_access.items()
+            if ts < deadline and user_id not in self._dirty
+        ]
+        for user_id in idle:
+            self._carts.pop(user_id, None)
+            self._last_access.pop(user_id, None)
+        return len(idle)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {"in_memory": len(self._carts), "dirty": len(self._dirty)}
+
+    # --- ВНУТРЕННЕЕ ---
+    async def _get(self, user_id: int) -> Dict[str, Tuple[int, int]]:
+        self._last_access[user_id] = time.monotonic()
+        cart = self._carts.get(user_id)
+        if cart is not None:
+            return cart
+        rows = await repository.load_cart(user_id)
+        # Пока шла загрузка, корзину мог создать параллельный запрос
+        return self._carts.setdefault(user_id, {a: (q, p) for a, q, p in rows})
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            evicted = self.evict_idle()
+            if evicted:
+                logger.info(f"🧹 Выгружено неактивных корзин: {evicted}")
+
+
+cart_store = CartStore()
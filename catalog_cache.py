@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import repository
+
+logger = logging.getLogger(__name__)
+
+
+def product_to_dict(p) -> dict:
+    """Компактная запись товара для кэша (без ORM-объекта)"""
+    return {
+        "id": p.id,
+        "article": p.article,
+        "name": p.name,
+        "name_en": p.name_en or p.name,
+        "brand": p.brand,
+        "volume": p.volume or "",
+        "price": p.price,
+        "description": p.description or "",
+    }
+
+
+def mini_app_item(p: dict) -> dict:
+    """Формат товара для Mini App"""
+    return {
+        "id": p["id"],
+        "article": p["article"],
+        "name": p["name_en"],
+        "brand": p["brand"],
+        "volume": p["volume"],
+        "price": p["price"],
+        "description": p["description"],
+    }
+
+
+class CatalogCache:
+    """
+    Кэш каталога на весь процесс.
+    Читатели получают товар через dict-lookup; писатели после коммита вызывают
+    apply() (точечное обновление) или invalidate() (полная перезагрузка при
+    следующем чтении). Каждое изменение увеличивает version.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._loaded_version = -1
+        self._lock = asyncio.Lock()
+        self.by_article: Dict[str, dict] = {}
+        self.by_id: Dict[int, dict] = {}
+        self.by_brand: Dict[str, List[str]] = {}
+        self.aliases: Dict[str, str] = {}  # прежний артикул → текущий (старые ссылки add_AP-100)
+        self.mini_app_items: List[dict] = []
+        self.mini_app_json = "[]"
+        self.hits = 0
+        self.misses = 0
+
+    # --- ЗАПИСЬ ---
+    def invalidate(self):
+        """Помечает кэш устаревшим: перезагрузка из БД при следующем чтении"""
+        self.version += 1
+
+    def apply(self, products: Iterable) -> None:
+        """Write-through: добавляет/обновляет закоммиченные товары без запроса к БД"""
+        changed = False
+        for p in products:
+            item = p if isinstance(p, dict) else product_to_dict(p)
+            old = self.by_article.get(item["article"])
+            if old is not None:
+                self._unindex(old)
+            self._index(item)
+            changed = True
+        if not changed:
+            return
+        self.version += 1
+        if self._loaded_version == self.version - 1:
+            # Кэш был актуален — достаточно пересобрать сериализованный список
+            self._serialize()
+            self._loaded_version = self.version
+
+    # --- ЧТЕНИЕ ---
+    async def get_by_article(self, article: str) -> Optional[dict]:
+        await self.ensure_loaded()
+        item = self.by_article.get(article)
+        if item is None and article in self.aliases:
+            item = self.by_article.get(self.aliases[article])
+        return self._count(item)
+
+    async def get_by_id(self, product_id: int) -> Optional[dict]:
+        await self.ensure_loaded()
+        return self._count(self.by_id.get(product_id))
+
+    async def list_by_brand(self, brand: str) -> List[dict]:
+        await self.ensure_loaded()
+        return [self.by_article[a] for a in self.by_brand.get(brand, [])]
+
+    async def list_for_mini_app(self) -> List[dict]:
+        await self.ensure_loaded()
+        return self.mini_app_items
+
+    async def ensure_loaded(self):
+        if self._loaded_version == self.version:
+            return
+        async with self._lock:
+            if self._loaded_version == self.version:
+                return
+            target_version = self.version
+            products = await repository.list_products()
+            self.aliases = await repository.list_article_aliases()
+            self.by_article.clear()
+            self.by_id.clear()
+            self.by_brand.clear()
+            for p in products:
+                self._index(product_to_dict(p))
+            self._serialize()
+            self._loaded_version = target_version
+            logger.info(f"✅ Кэш каталога загружен: {len(self.by_article)} товаров, версия {target_version}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "products": len(self.by_article),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # --- ВНУТРЕННЕЕ ---
+    def _count(self, item: Optional[dict]) -> Optional[dict]:
+        if item is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return item
+
+    def _index(self, item: dict):
+        self.by_article[item["article"]] = item
+        self.by_id[item["id"]] = item
+        self.by_brand.setdefault(item["brand"], []).append(item["article"])
+
+    def _unindex(self, item: dict):
+        self.by_id.pop(item["id"], None)
+        articles = self.by_brand.get(item["brand"], [])
+        if item["article"] in articles:
+            articles.remove(item["article"])
+
+    def _serialize(self):
+        items = sorted(self.by_id.values(), key=lambda p: p["id"])
+        self.mini_app_items = [mini_app_item(p) for p in items]
+        self.mini_app_json = json.dumps(self.mini_app_items, ensure_ascii=False, separators=(',', ':'))
+
+
+catalog_cache = CatalogCache()
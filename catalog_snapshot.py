@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Optional
+
+from catalog_cache import catalog_cache
+from config import SNAPSHOT_KEEP
+
+logger = logging.getLogger(__name__)
+
+# Папка общая с api/api_server.py, который раздаёт снапшоты Mini App
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api", "snapshots")
+os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+_published = {"version": None, "snapshot_id": None}
+_lock = asyncio.Lock()
+
+
+def snapshot_id_for(payload: bytes) -> str:
+    """Идентификатор снапшота — префикс SHA-256 содержимого"""
+    return hashlib.sha256(payload).hexdigest()[:20]
+
+
+def write_snapshot(payload: bytes) -> str:
+    """Атомарно сохраняет неизменяемый снапшот; повторная запись того же содержимого только обновляет mtime"""
+    snapshot_id = snapshot_id_for(payload)
+    path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.json")
+    if os.path.exists(path):
+        # Каталог вернулся к прежнему содержимому: снапшот снова текущий и должен
+        # считаться самым свежим, иначе очистка удалит его, пока он опубликован
+        os.utime(path)
+    else:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        _prune_old_snapshots(keep=path)
+        logger.info(f"✅ Опубликован снапшот каталога: {snapshot_id}")
+    return snapshot_id
+
+
+def _prune_old_snapshots(keep: str):
+    """
+    Оставляет SNAPSHOT_KEEP последних снапшотов, чтобы уже открытые Mini App не ломались.
+    Публикуемый снапшот keep не удаляется ни при каком порядке mtime.
+    """
+    files = [
+        os.path.join(SNAPSHOT_DIR, name)
+        for name in os.listdir(SNAPSHOT_DIR)
+        if name.endswith(".json") and os.path.join(SNAPSHOT_DIR, name) != keep
+    ]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[max(0, SNAPSHOT_KEEP - 1):]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось удалить снапшот {path}: {e}")
+
+
+async def get_snapshot_id() -> Optional[str]:
+    """
+    Возвращает id снапшота для текущей версии каталога.
+    Снапшот публикуется один раз на версию; None — если каталог пуст.
+    """
+    await catalog_cache.ensure_loaded()
+    if _published["version"] == catalog_cache.version:
+        return _published["snapshot_id"]
+
+    async with _lock:
+        version = catalog_cache.version
+        if _published["version"] == version:
+            return _published["snapshot_id"]
+        if not catalog_cache.mini_app_items:
+            snapshot_id = None
+        else:
+            payload = catalog_cache.mini_app_json.encode("utf-8")
+            loop = asyncio.get_running_loop()
+            snapshot_id = await loop.run_in_executor(None, write_snapshot, payload)
+        _published["version"] = version
+        _published["snapshot_id"] = snapshot_id
+        return snapshot_id
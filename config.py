@@ -18,6 +18,125 @@ EXCHANGE_RATE = float(os.getenv("EXCHANGE_RATE", "0.072"))
 YANDEX_API_KEY = os.getenv("YANDEX_API_KEY")
 YANDEX_FOLDER_ID = os.getenv("YANDEX_FOLDER_ID")
 
+# Корзины: период сброса изменений в SQLite и время простоя до выгрузки из памяти (сек)
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "5"))
+CART_IDLE_TTL = float(os.getenv("CART_IDLE_TTL", "1800"))
+
+# Mini App: адрес страницы и число хранимых снапшотов каталога
+MINI_APP_URL = os.getenv("MINI_APP_URL", "https://johngar1312-hue.github.io/korea-catalog-miniapp")
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "20"))
+
+# Ингестия: сколько описаний генерировать параллельно
+DESCRIPTION_CONCURRENCY = int(os.getenv("DESCRIPTION_CONCURRENCY", "4"))
+# Пакетная генерация описаний: товаров в одном запросе, лимит ответа и оценка токенов на одно описание
+DESCRIPTION_BATCH_SIZE = int(os.getenv("DESCRIPTION_BATCH_SIZE", "8"))
+DESCRIPTION_BATCH_MAX_TOKENS = int(os.getenv("DESCRIPTION_BATCH_MAX_TOKENS", "6000"))
+DESCRIPTION_TOKENS_PER_ITEM = int(os.getenv("DESCRIPTION_TOKENS_PER_ITEM", "600"))
+
+# Извлечение товаров YandexGPT: размер фрагмента OCR-текста (символов), параллельность, лимит ответа
+GPT_CHUNK_CHARS = int(os.getenv("GPT_CHUNK_CHARS", "1200"))
+GPT_CHUNK_CONCURRENCY = int(os.getenv("GPT_CHUNK_CONCURRENCY", "4"))
+GPT_MAX_TOKENS = int(os.getenv("GPT_MAX_TOKENS", "2000"))
+# Локальный разбор по координатам строк: при уверенности не ниже порога GPT не вызывается (> 1 — всегда GPT)
+LAYOUT_CONFIDENCE_THRESHOLD = float(os.getenv("LAYOUT_CONFIDENCE_THRESHOLD", "0.85"))
+
+# Обновлять цены уже существующих товаров при повторной загрузке каталога
+UPDATE_EXISTING_PRICES = os.getenv("UPDATE_EXISTING_PRICES", "0") == "1"
+
+# Фоновая очередь загрузки каталогов: число воркеров
+# (фото альбома, обрабатываемые одновременно, уходят в Vision одним запросом)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+# Сколько раз задача может начаться заново после рестарта: задача, которая роняет процесс,
+# иначе перезапускалась бы бесконечно
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+# Режим работы: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Сколько апдейтов обрабатывать одновременно (в обоих режимах)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+# Вебхук: публичный URL (без пути), адрес прослушивания и секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# Рассылки: общий лимит Telegram (сообщ./сек), лимит на один чат, размер страницы получателей
+# и сколько сообщений страницы отправляется одновременно (чтобы упираться в лимит, а не в задержку сети)
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_PER_CHAT_RATE = float(os.getenv("BROADCAST_PER_CHAT_RATE", "1"))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "50"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "25"))
+
+# Общий HTTP-клиент для Yandex Cloud: размер пула соединений и таймауты (сек)
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", "100"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "120"))
+
+# Метрики и спаны этапов загрузки (metrics.py): 0 — выключены, почти без накладных расходов
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Устойчивость вызовов Yandex Cloud (resilience.py): таймауты по эндпоинтам (сек), повторы с backoff,
+# circuit breaker (ошибок подряд до размыкания, пауза до пробного запроса) и хеджирование
+YANDEX_VISION_TIMEOUT = float(os.getenv("YANDEX_VISION_TIMEOUT", "30"))
+YANDEX_GPT_TIMEOUT = float(os.getenv("YANDEX_GPT_TIMEOUT", "60"))
+YANDEX_RETRIES = int(os.getenv("YANDEX_RETRIES", "3"))
+YANDEX_BACKOFF_BASE = float(os.getenv("YANDEX_BACKOFF_BASE", "0.5"))
+YANDEX_BACKOFF_MAX = float(os.getenv("YANDEX_BACKOFF_MAX", "10"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+# 1 — если ответ дольше p95 эндпоинта, отправляется дублирующий запрос (платный: удваивает вызовы в хвосте)
+YANDEX_HEDGE = os.getenv("YANDEX_HEDGE", "0") == "1"
+
+# Общий планировщик вызовов Yandex Cloud (scheduler.py): лимит одновременных запросов на весь бот
+# и по моделям, запросов в секунду и токенов в минуту (0 — без ограничения; квоты зависят от облака)
+YANDEX_MAX_CONCURRENCY = int(os.getenv("YANDEX_MAX_CONCURRENCY", "8"))
+YANDEX_GPT_CONCURRENCY = int(os.getenv("YANDEX_GPT_CONCURRENCY", "6"))
+YANDEX_VISION_CONCURRENCY = int(os.getenv("YANDEX_VISION_CONCURRENCY", "4"))
+YANDEX_GPT_RPS = float(os.getenv("YANDEX_GPT_RPS", "10"))
+YANDEX_VISION_RPS = float(os.getenv("YANDEX_VISION_RPS", "10"))
+YANDEX_GPT_TPM = float(os.getenv("YANDEX_GPT_TPM", "0"))
+
+# Подготовка фото к OCR: максимальная сторона (px), качество JPEG, оттенки серого,
+# нарезка высоких скриншотов на фрагменты с соотношением высоты к ширине не больше OCR_TILE_ASPECT
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2048"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") == "1"
+OCR_TILING = os.getenv("OCR_TILING", "0") == "1"
+OCR_TILE_ASPECT = float(os.getenv("OCR_TILE_ASPECT", "2.5"))
+
+# Отладка: сохранять загруженные фото каталога в uploads/ (по умолчанию обработка только в памяти)
+SPOOL_UPLOADS = os.getenv("SPOOL_UPLOADS", "0") == "1"
+
+# Кэш OCR по хэшу изображения: максимум записей (LRU) и порог расстояния Хэмминга
+# для почти-дубликатов по перцептивному хэшу (0 — только точное совпадение)
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "500"))
+OCR_CACHE_PHASH_DISTANCE = int(os.getenv("OCR_CACHE_PHASH_DISTANCE", "0"))
+
+# Кэш описаний товаров по бренду и названию: срок жизни (дней), максимум записей (LRU),
+# учитывать ли объём в ключе и принудительная перегенерация всех описаний
+DESCRIPTION_CACHE_TTL_DAYS = float(os.getenv("DESCRIPTION_CACHE_TTL_DAYS", "180"))
+DESCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv("DESCRIPTION_CACHE_MAX_ENTRIES", "5000"))
+DESCRIPTION_CACHE_BY_VOLUME = os.getenv("DESCRIPTION_CACHE_BY_VOLUME", "0") == "1"
+DESCRIPTION_FORCE_REFRESH = os.getenv("DESCRIPTION_FORCE_REFRESH", "0") == "1"
+
+# Пакетный перевод названий (translation.py): сколько строк в одном запросе к YandexGPT
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "40"))
+
+# PDF-каталоги: сколько страниц обрабатывать параллельно, минимум символов текстового слоя,
+# при котором страница не отправляется в OCR, и DPI растеризации остальных страниц
+PDF_PAGE_CONCURRENCY = int(os.getenv("PDF_PAGE_CONCURRENCY", "4"))
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "50"))
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+# Процессы для растеризации страниц PDF (PyMuPDF не потокобезопасен, поэтому процессы, а не потоки)
+PDF_RENDER_PROCESSES = int(os.getenv("PDF_RENDER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+# Пакетирование Yandex Vision: окно ожидания (сек), максимум изображений и байт (base64) в одном batchAnalyze
+VISION_BATCH_WINDOW = float(os.getenv("VISION_BATCH_WINDOW", "0.3"))
+VISION_BATCH_MAX = int(os.getenv("VISION_BATCH_MAX", "8"))
+VISION_BATCH_MAX_BYTES = int(os.getenv("VISION_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+
 # Справочник стран
 COUNTRIES = {
     "korea": "🇰🇷 Корея",
@@ -43,4 +162,6 @@ if not TOKEN:
 if not YANDEX_API_KEY:
     raise ValueError("❌ Не задан YANDEX_API_KEY в файле .env")
 if not YANDEX_FOLDER_ID:
-    raise ValueError("❌ Не задан YANDEX_FOLDER_ID в файле .env")
\ No newline at end of file
+    raise ValueError("❌ Не задан YANDEX_FOLDER_ID в файле .env")
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise ValueError("❌ Не задан WEBHOOK_SECRET в файле .env (обязателен для BOT_MODE=webhook)")
\ No newline at end of file
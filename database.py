@@ -1,6 +1,8 @@
+import re
 from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 from models import Base
+from article_utils import make_article
 import os
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
@@ -41,5 +43,80 @@ def init_db():
                     conn.commit()
                     print(f"[INFO] Добавлена колонка: {col_name} в таблицу products")
 
+    if 'ingest_jobs' in inspector.get_table_names():
+        existing_columns = {col['name'] for col in inspector.get_columns('ingest_jobs')}
+        if 'kind' not in existing_columns:
+            with engine.connect() as conn:
+                conn.execute(text("ALTER TABLE ingest_jobs ADD COLUMN kind VARCHAR(20) DEFAULT 'photo';"))
+                conn.commit()
+                print("[INFO] Добавлена колонка: kind в таблицу ingest_jobs")
+        if 'metrics' not in existing_columns:
+            with engine.connect() as conn:
+                conn.execute(text("ALTER TABLE ingest_jobs ADD COLUMN metrics VARCHAR;"))
+                conn.commit()
+                print("[INFO] Добавлена колонка: metrics в таблицу ingest_jobs")
+
+    if 'products' in inspector.get_table_names():
+        migrate_legacy_articles()
+
+
+# Старая нумерация артикулов: AP-100, AP-101… (до артикулов из содержимого)
+LEGACY_ARTICLE = re.compile(r"^AP-\d+$")
+
+
+def migrate_legacy_articles():
+    """
+    Однократно (отметка в schema_migrations) переводит товары со старой нумерацией
+    AP-100, AP-101… на артикулы из бренда, названия и объёма — как при загрузке,
+    иначе повторная загрузка каталога добавит их заново. Артикулы другого вида
+    (заведённые вручную) не трогаются. Признак рефилла в products не хранится,
+    поэтому старые строки считаются обычными товарами.
+
+    Старый артикул сохраняется в article_aliases: ссылки add_AP-100 и старые
+    HTML-каталоги продолжают открывать товар. Если новый артикул уже занят (тот же
+    товар загружен дважды), дубликат сливается с ним: заказы и корзины переходят
+    на оставшийся товар, строка дубликата удаляется.
+    """
+    with engine.connect() as conn:
+        done = conn.execute(
+            text("SELECT 1 FROM schema_migrations WHERE name = :name"), {"name": "legacy_articles"}
+        ).first()
+        if done:
+            return
+        rows = conn.execute(text("SELECT id, article, brand, name, name_en, volume FROM products ORDER BY id")).fetchall()
+        owner = {row.article: row.id for row in rows}
+        migrated = merged = 0
+        for row in rows:
+            if not LEGACY_ARTICLE.match(row.article or ""):
+                continue
+            article = make_article({
+                "brand": row.brand,
+                "product": row.name or row.name_en,
+                "volume": row.volume,
+                "refill": False,
+            })
+            params = {"new": article, "old": row.article, "id": row.id}
+            if article in owner:
+                params["target"] = owner[article]
+                conn.execute(text("UPDATE orders SET product_id = :target WHERE product_id = :id"), params)
+                conn.execute(text("DELETE FROM products WHERE id = :id"), params)
+                merged += 1
+            else:
+                conn.execute(text("UPDATE products SET article = :new WHERE id = :id"), params)
+                owner[article] = row.id
+                migrated += 1
+            # Позиция, которая уже есть в корзине под новым артикулом, остаётся одна
+            conn.execute(text("UPDATE OR IGNORE cart_items SET article = :new WHERE article = :old"), params)
+            conn.execute(text("DELETE FROM cart_items WHERE article = :old"), params)
+            conn.execute(text("INSERT OR REPLACE INTO article_aliases (alias, article) VALUES (:old, :new)"), params)
+        conn.execute(
+            text("INSERT INTO schema_migrations (name, applied_at) VALUES (:name, CURRENT_TIMESTAMP)"),
+            {"name": "legacy_articles"},
+        )
+        conn.commit()
+    if migrated or merged:
+        print(f"[INFO] Артикулы товаров: переведено на новый формат {migrated}, слито дубликатов {merged}")
+
+
 # ✅ Важно: вызываем init_db() при старте
 init_db()
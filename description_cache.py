@@ -0,0 +1,56 @@
+import datetime
+import logging
+from typing import Dict, Iterable
+
+import repository
+from article_utils import normalize_text, normalize_volume
+from config import DESCRIPTION_CACHE_BY_VOLUME, DESCRIPTION_CACHE_MAX_ENTRIES, DESCRIPTION_CACHE_TTL_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+class DescriptionCache:
+    """
+    Персистентный кэш описаний товаров (таблица description_cache).
+    Ключ — нормализованные бренд и название без объёма: 60 ml и 90 ml одного
+    крема получают одно описание. Записи старше ttl_days считаются устаревшими,
+    размер ограничен max_entries (LRU).
+    """
+
+    def __init__(self, ttl_days: float = DESCRIPTION_CACHE_TTL_DAYS,
+                 max_entries: int = DESCRIPTION_CACHE_MAX_ENTRIES,
+                 by_volume: bool = DESCRIPTION_CACHE_BY_VOLUME):
+        self.ttl = datetime.timedelta(days=ttl_days)
+        self.max_entries = max_entries
+        self.by_volume = by_volume
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, item: dict) -> str:
+        key = f"{normalize_text(item.get('brand'))}|{normalize_text(item.get('product'))}"
+        if self.by_volume:
+            key += f"|{normalize_volume(item.get('volume'))}"
+        return key
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(dict.fromkeys(keys))
+        found = await repository.get_descriptions(keys, datetime.datetime.now() - self.ttl)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def put_many(self, descriptions: Dict[str, str]):
+        evicted = await repository.put_descriptions(descriptions, self.max_entries)
+        if evicted:
+            logger.info(f"🧹 Кэш описаний: вытеснено {evicted} записей")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+description_cache = DescriptionCache()
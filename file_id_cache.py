@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+# Кэш Telegram file_id: sha256 содержимого файла → file_id уже загруженного документа
+CACHE_FILE = "data/file_id_cache.json"
+os.makedirs("data", exist_ok=True)
+
+_file_ids = {}
+if os.path.exists(CACHE_FILE):
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            _file_ids = json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось загрузить кэш file_id: {e}")
+
+# (path, mtime, size) → (sha256, bytes): файл перечитывается только после изменения
+_content_by_stat = {}
+
+
+def _save_cache():
+    try:
+        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(_file_ids, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.error(f"❌ Не удалось сохранить кэш file_id: {e}")
+
+
+def _read_with_hash(path: str) -> tuple:
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    cached = _content_by_stat.get(key)
+    if cached is not None:
+        return cached
+    with open(path, "rb") as f:
+        data = f.read()
+    cached = (hashlib.sha256(data).hexdigest(), data)
+    _content_by_stat.clear()  # храним только последнюю версию файла
+    _content_by_stat[key] = cached
+    return cached
+
+
+async def send_cached_document(bot, chat_id: int, path: str, filename: str):
+    """
+    Отправляет файл документом. Первый раз — загрузкой, дальше — по сохранённому
+    file_id, пока содержимое файла не изменится.
+    """
+    loop = asyncio.get_running_loop()
+    content_hash, data = await loop.run_in_executor(None, _read_with_hash, path)
+
+    file_id = _file_ids.get(content_hash)
+    if file_id:
+        try:
+            return await bot.send_document(chat_id=chat_id, document=file_id)
+        except BadRequest as e:
+            logger.warning(f"⚠️ file_id устарел, загружаем файл заново: {e}")
+            _file_ids.pop(content_hash, None)
+
+    message = await bot.send_document(chat_id=chat_id, document=data, filename=filename)
+    _file_ids[content_hash] = message.document.file_id
+    await loop.run_in_executor(None, _save_cache)
+    return message
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+
+from config import HTTP_CONNECT_TIMEOUT, HTTP_LIMIT, HTTP_LIMIT_PER_HOST, HTTP_TOTAL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Одна сессия на процесс: keep-alive соединения к Yandex Cloud переиспользуются
+_session: Optional[aiohttp.ClientSession] = None
+_lock = asyncio.Lock()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Общая aiohttp-сессия с пулом соединений; создаётся при первом обращении"""
+    global _session
+    if _session is not None and not _session.closed:
+        return _session
+    async with _lock:
+        if _session is None or _session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_LIMIT,
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            timeout = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT)
+            _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            logger.info("✅ HTTP-клиент создан")
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,85 @@
+import asyncio
+import io
+import logging
+import time
+from typing import Tuple
+
+from config import OCR_GRAYSCALE, OCR_JPEG_QUALITY, OCR_MAX_SIDE, OCR_TILE_ASPECT, OCR_TILING
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    logger.warning("⚠️ Pillow не установлен: изображения отправляются в OCR без сжатия (pip install Pillow)")
+
+
+def _encode_jpeg(img, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def prepare_image_for_ocr(data) -> Tuple[list, dict]:
+    """
+    Уменьшает изображение до OCR_MAX_SIDE, переводит в оттенки серого и пережимает в JPEG.
+    При OCR_TILING очень высокие скриншоты режутся на перекрывающиеся фрагменты.
+    data — bytes / bytearray / memoryview. Возвращает (список JPEG-фрагментов, статистика).
+    Без Pillow (или если пережатие не уменьшило размер) возвращается исходный буфер без копии.
+    """
+    started = time.perf_counter()
+    original_size = len(data)
+    if Image is None:
+        return [data], {"original_bytes": original_size, "processed_bytes": original_size,
+                        "tiles": 1, "ms": 0.0}
+
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.exif_transpose(img)
+    img = img.convert("L") if OCR_GRAYSCALE else img.convert("RGB")
+    width, height = img.size
+
+    tiled = OCR_TILING and height > width * OCR_TILE_ASPECT
+    # Для нарезки ограничиваем ширину, а не длинную сторону — иначе мелкий текст теряется
+    scale = min(1.0, OCR_MAX_SIDE / (width if tiled else max(width, height)))
+    if scale < 1.0:
+        img = img.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+        width, height = img.size
+
+    if tiled:
+        tile_height = min(OCR_MAX_SIDE, int(width * OCR_TILE_ASPECT))
+        overlap = tile_height // 10  # строка на границе попадёт целиком хотя бы в один фрагмент
+        tiles, top = [], 0
+        while True:
+            bottom = min(height, top + tile_height)
+            tiles.append(_encode_jpeg(img.crop((0, top, width, bottom)), OCR_JPEG_QUALITY))
+            if bottom >= height:
+                break
+            top = bottom - overlap
+    else:
+        tiles = [_encode_jpeg(img, OCR_JPEG_QUALITY)]
+
+    processed_size = sum(len(t) for t in tiles)
+    if not tiled and processed_size >= original_size and scale == 1.0:
+        # Пережатие не помогло — отправляем оригинал
+        tiles, processed_size = [data], original_size
+
+    stats = {
+        "original_bytes": original_size,
+        "processed_bytes": processed_size,
+        "tiles": len(tiles),
+        "ms": (time.perf_counter() - started) * 1000,
+    }
+    return tiles, stats
+
+
+async def preprocess_for_ocr(data) -> Tuple[list, dict]:
+    """prepare_image_for_ocr в пуле потоков, чтобы не блокировать event loop"""
+    loop = asyncio.get_running_loop()
+    tiles, stats = await loop.run_in_executor(None, prepare_image_for_ocr, data)
+    saved = stats["original_bytes"] - stats["processed_bytes"]
+    logger.info(
+        f"🖼 Подготовка к OCR: {stats['original_bytes']} → {stats['processed_bytes']} байт "
+        f"(сэкономлено {saved}), фрагментов: {stats['tiles']}, {stats['ms']:.0f} мс"
+    )
+    return tiles, stats
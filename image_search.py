@@ -1,9 +1,14 @@
 import asyncio
 import json
+import logging
 import os
-from typing import Optional
+from typing import List, Optional
 import requests
-from ai_description import translate_korean_to_english
+from translation import translation_memory
+from metrics import incr, span
+from scheduler import priority
+
+logger = logging.getLogger(__name__)
 
 # Кэш для URL изображений
 CACHE_FILE = "data/image_cache.json"
@@ -16,7 +21,7 @@ if os.path.exists(CACHE_FILE):
         with open(CACHE_FILE, 'r', encoding='utf-8') as f:
             _image_cache = json.load(f)
     except Exception as e:
-        print(f"[WARNING] Не удалось загрузить кэш: {e}")
+        logger.warning(f"⚠️ Не удалось загрузить кэш изображений: {e}")
 
 
 def _save_cache():
@@ -25,7 +30,7 @@ def _save_cache():
         with open(CACHE_FILE, 'w', encoding='utf-8') as f:
             json.dump(_image_cache, f, ensure_ascii=False, indent=2)
     except Exception as e:
-        print(f"[ERROR] Не удалось сохранить кэш: {e}")
+        logger.error(f"❌ Не удалось сохранить кэш изображений: {e}")
 
 
 def is_clean_url(url: str) -> bool:
@@ -111,29 +116,54 @@ async def find_image_url(brand: str, product: str, volume: str = "") -> Optional
     # Проверяем кэш
     key = original_query.lower().strip()
     if key in _image_cache:
-        print(f"[DEBUG] Найдено в кэше: {key} → {_image_cache[key]}")
+        logger.debug(f"Найдено в кэше: {key} → {_image_cache[key]}")
+        incr("image_search.cache_hits")
         return _image_cache[key]
 
+    with span("image_search"):
+        return await _find_image_url(key, brand, product, volume, original_query)
+
+
+async def _find_image_url(key: str, brand: str, product: str, volume: str, original_query: str) -> Optional[str]:
     # Переводим на английский
-    translated_product = await translate_korean_to_english(product)
+    with span("image_search.translate"):
+        translated_product = await translation_memory.translate(product)
     full_query_en = f"{brand} {translated_product} {volume}".strip()
 
     # Пробуем поиск
     for query in [full_query_en, original_query]:
-        result = await _search_with_filters(query)
+        with span("image_search.ddg"):
+            result = await _search_with_filters(query)
         if result:
             # Дополнительная проверка: прямая ссылка на изображение
             if await is_direct_image_url(result):
                 _image_cache[key] = result
                 _save_cache()
-                print(f"[DEBUG] Сохранено в кэш: {key} → {result}")
+                logger.debug(f"Сохранено в кэш: {key} → {result}")
                 return result
             else:
-                print(f"[DEBUG] Пропущено (не прямое фото): {result}")
+                logger.debug(f"Пропущено (не прямое фото): {result}")
 
     return None
 
 
+async def find_image_urls(items: List[dict]) -> List[Optional[str]]:
+    """
+    Поиск изображений для многих товаров (dict с brand/product/volume).
+    Все названия сначала переводятся одним пакетом (translation.py), поэтому
+    каждое уникальное название переводится не больше одного раза.
+    Это массовый проход: вызовы YandexGPT идут с приоритетом backfill и
+    уступают загрузкам каталогов.
+    """
+    with priority("backfill"):
+        with span("image_search.translate"):
+            await translation_memory.translate_many(item["product"] for item in items)
+        return [
+            await find_image_url(item["brand"], item["product"], item.get("volume", ""))
+            for item in items
+        ]
+
+
 async def _search_with_filters(query: str) -> Optional[str]:
     """Выполняет поиск с фильтрацией по качеству и источникам"""
     try:
@@ -162,7 +192,7 @@ async def _search_with_filters(query: str) -> Optional[str]:
 
             for search_query in search_queries:
                 try:
-                    print(f"[DEBUG] Поиск: {search_query}")
+                    logger.debug(f"Поиск: {search_query}")
                     results = ddgs.images(
                         query=search_query,
                         region="kr-kr",
@@ -177,24 +207,24 @@ async def _search_with_filters(query: str) -> Optional[str]:
                         if not img_url:
                             continue
 
-                        print(f"[DEBUG] Найдено изображение: {img_url}")
+                        logger.debug(f"Найдено изображение: {img_url}")
 
                         if not is_clean_url(img_url):
-                            print(f"[DEBUG] Пропущено (плохой URL): {img_url}")
+                            logger.debug(f"Пропущено (плохой URL): {img_url}")
                             continue
 
                         if not is_high_quality_image(img_url):
-                            print(f"[DEBUG] Пропущено (низкое качество): {img_url}")
+                            logger.debug(f"Пропущено (низкое качество): {img_url}")
                             continue
 
                         # Проверяем, ведёт ли ссылка напрямую на изображение
                         if not await is_direct_image_url(img_url):
-                            print(f"[DEBUG] Пропущено (не прямое изображение): {img_url}")
+                            logger.debug(f"Пропущено (не прямое изображение): {img_url}")
                             continue
 
                         title = r.get("title", "").lower()
                         if any(word in title for word in ["front", "main", "정품", "gift", "set", "product", "packaging"]):
-                            print(f"[DEBUG] ✅ Выбрано по приоритету: {img_url}")
+                            logger.debug(f"✅ Выбрано по приоритету: {img_url}")
                             return img_url
 
                     # Если не нашли с приоритетом — возвращаем первое подходящее
@@ -203,16 +233,16 @@ async def _search_with_filters(query: str) -> Optional[str]:
                         if not img_url:
                             continue
                         if is_clean_url(img_url) and is_high_quality_image(img_url) and await is_direct_image_url(img_url):
-                            print(f"[DEBUG] ✅ Возвращаем первое подходящее: {img_url}")
+                            logger.debug(f"✅ Возвращаем первое подходящее: {img_url}")
                             return img_url
 
                 except Exception as e:
-                    print(f"[INFO] Поиск не удался для: {search_query} | {e}")
+                    logger.info(f"Поиск не удался для: {search_query} | {e}")
                     continue
 
     except ImportError:
-        print("[ERROR] Установите: pip install duckduckgo-search")
+        logger.error("❌ Установите: pip install duckduckgo-search")
     except Exception as e:
-        print(f"[ERROR] Ошибка в поиске: {e}")
+        logger.error(f"❌ Ошибка в поиске: {e}")
 
     return None
\ No newline at end of file
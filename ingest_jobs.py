@@ -0,0 +1,170 @@
+import asyncio
+import datetime
+import json
+import logging
+from typing import List, Optional
+
+import repository
+from config import INGEST_MAX_ATTEMPTS, INGEST_WORKERS
+from ingestion import format_timings, ingest_catalog_pdf, ingest_catalog_photo
+from metrics import format_summary, job_trace
+
+logger = logging.getLogger(__name__)
+
+STATUS_ICONS = {"queued": "🕓", "running": "⚙️", "done": "✅", "failed": "❌"}
+
+
+class IngestJobQueue:
+    """
+    Очередь задач загрузки каталога. Задачи хранятся в SQLite (ingest_jobs),
+    в памяти — только очередь их id для воркеров. После рестарта незавершённые
+    задачи возвращаются в очередь и выполняются заново, но не больше
+    INGEST_MAX_ATTEMPTS запусков — затем задача помечается failed.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._running = set()
+        self._bot = None
+
+    async def start(self, bot):
+        self._bot = bot
+        for job_id in await repository.requeue_interrupted_jobs():
+            self._queue.put_nowait(job_id)
+        if self._queue.qsize():
+            logger.info(f"🔁 Возобновлено задач загрузки: {self._queue.qsize()}")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(max(1, self.workers))]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, user_id: int, chat_id: int, file_id: str, source_type: str,
+                      progress_message_id: Optional[int] = None, kind: str = "photo") -> int:
+        job = await repository.create_job(
+            user_id=user_id,
+            chat_id=chat_id,
+            file_id=file_id,
+            source_type=source_type,
+            kind=kind,
+            status="queued",
+            progress_message_id=progress_message_id,
+        )
+        self._queue.put_nowait(job.id)
+        return job.id
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def running(self) -> int:
+        return len(self._running)
+
+    # --- ВНУТРЕННЕЕ ---
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            self._running.add(job_id)
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"❌ Воркер {index}: задача #{job_id} упала: {e}")
+            finally:
+                self._running.discard(job_id)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: int):
+        job = await repository.get_job(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return
+        if (job.attempts or 0) >= INGEST_MAX_ATTEMPTS:
+            # Каждый прошлый запуск прервался, не дойдя до конца, — вероятно, задача роняет процесс
+            error = f"попыток: {job.attempts}, все прерваны — повторы остановлены"
+            logger.error(f"❌ Задача #{job_id}: {error}")
+            await repository.update_job(job_id, status="failed", error=error, finished_at=datetime.datetime.now())
+            await self._progress(job, f"❌ Задача #{job_id}: {error}")
+            return
+
+        await repository.update_job(
+            job_id,
+            status="running",
+            attempts=(job.attempts or 0) + 1,
+            started_at=datetime.datetime.now(),
+        )
+
+        async def on_stage(stage: str):
+            await repository.update_job(job_id, stage=stage)
+            await self._progress(job, f"⚙️ Задача #{job_id}: {stage}…")
+
+        # Все спаны задачи (скачивание, OCR, GPT, описания, БД) собираются в одну сводку
+        with job_trace(f"job-{job_id}") as trace:
+            try:
+                ingest = ingest_catalog_pdf if job.kind == "pdf" else ingest_catalog_photo
+                result, timings = await ingest(self._bot, job.file_id, job.source_type, on_stage)
+            except Exception as e:
+                result, error = None, e
+        metrics = json.dumps(trace.summary(), ensure_ascii=False)
+
+        if result is None:
+            logger.error(f"❌ Задача #{job_id}: {error}")
+            await repository.update_job(
+                job_id, status="failed", error=str(error), metrics=metrics, finished_at=datetime.datetime.now()
+            )
+            await self._progress(job, f"❌ Задача #{job_id}: ошибка: {error}")
+            return
+
+        await repository.update_job(
+            job_id,
+            status="done",
+            stage=None,
+            result=json.dumps(result),
+            timings=json.dumps(timings, ensure_ascii=False),
+            metrics=metrics,
+            finished_at=datetime.datetime.now(),
+        )
+        await self._progress(
+            job,
+            f"✅ Задача #{job_id} выполнена\n"
+            f"Добавлено: {result['inserted']} товаров\n"
+            f"🔄 Обновлено цен: {result['updated']}\n"
+            f"⏭ Пропущено: {result['skipped']}\n\n" + format_timings(timings)
+        )
+
+    async def _progress(self, job, text: str):
+        """Обновляет сообщение о прогрессе; если его нет — отправляет новое"""
+        try:
+            if job.progress_message_id:
+                await self._bot.edit_message_text(text, chat_id=job.chat_id, message_id=job.progress_message_id)
+            else:
+                message = await self._bot.send_message(job.chat_id, text)
+                job.progress_message_id = message.message_id
+                await repository.update_job(job.id, progress_message_id=message.message_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить прогресс задачи #{job.id}: {e}")
+
+
+def format_job(job) -> str:
+    icon = STATUS_ICONS.get(job.status, "•")
+    line = f"{icon} #{job.id} {job.status}"
+    if job.status == "running" and job.stage:
+        line += f" — {job.stage}"
+    if job.result:
+        result = json.loads(job.result)
+        line += f" — +{result['inserted']} / 🔄{result['updated']} / ⏭{result['skipped']}"
+    if job.timings:
+        timings = json.loads(job.timings)
+        stages = " · ".join(f"{stage} {seconds:.1f}с" for stage, seconds in timings.items())
+        line += f"\n   ⏱ {sum(timings.values()):.1f} с ({stages})"
+    if job.metrics:
+        spans = format_summary(json.loads(job.metrics), limit=4)
+        if spans:
+            line += f"\n   📊 {spans}"
+    if job.status == "failed" and job.error:
+        line += f"\n   {job.error[:200]}"
+    return line
+
+
+ingest_queue = IngestJobQueue()
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+import repository
+from ai_description import generate_descriptions
+from catalog_cache import catalog_cache
+from config import SPOOL_UPLOADS, UPDATE_EXISTING_PRICES
+from metrics import span
+from price_utils import convert_krw_to_rub_with_discount_and_markup
+from pdf_parser import parse_pdf_catalog
+from vision_parser import parse_catalog_with_tesseract
+
+logger = logging.getLogger(__name__)
+
+StageCallback = Callable[[str], Awaitable[None]]
+
+
+def format_timings(timings: dict) -> str:
+    lines = [f"• {stage}: {seconds:.1f} с" for stage, seconds in timings.items()]
+    lines.append(f"⏱ Всего: {sum(timings.values()):.1f} с")
+    return "\n".join(lines)
+
+
+def _spool_to_disk(filename: str, data) -> None:
+    os.makedirs("uploads", exist_ok=True)
+    with open(f"uploads/{filename}", "wb") as f:
+        f.write(data)
+
+
+def build_product_row(item: dict, source_type: str, description: str) -> dict:
+    if source_type == "excel_catalog":
+        price_rub = item["price_krw"]  # Уже в RUB
+    else:
+        price_rub = convert_krw_to_rub_with_discount_and_markup(
+            item["price_krw"],
+            is_korean_catalog=True
+        )
+
+    return {
+        "article": item["article"],
+        "name": item["product"],
+        "name_en": item["product"],
+        "brand": item["brand"],
+        "price": price_rub,
+        "description": description,
+        "volume": item.get("volume", ""),
+        "category": "Крема",
+        "country": "Корея",
+        "in_stock": 10,
+    }
+
+
+async def store_products(products_data: list, source_type: str, timings: dict, stage) -> dict:
+    """Описания для новых товаров и upsert в БД; время этапов добавляется в timings"""
+    # Артикулы стабильны (article_utils.make_article): уже известные товары узнаём
+    # одним IN-запросом и не тратим на них вызовы GPT
+    existing = await repository.find_existing_prices(item["article"] for item in products_data)
+    new_items = [item for item in products_data if item["article"] not in existing]
+    if products_data:
+        logger.info(f"♻️ Уже в каталоге: {len(products_data) - len(new_items)}, новых: {len(new_items)}")
+
+    started = await stage("Описания")
+    with span("ingest.descriptions"):
+        descriptions = await generate_descriptions(new_items)
+    _add_timing(timings, "Описания", time.perf_counter() - started)
+    description_by_article = {
+        item["article"]: description for item, description in zip(new_items, descriptions)
+    }
+
+    started = await stage("Запись в БД")
+    rows = [
+        build_product_row(item, source_type, description_by_article.get(item["article"], ""))
+        for item in products_data
+    ]
+    with span("ingest.db"):
+        result = await repository.upsert_products(rows, update_prices=UPDATE_EXISTING_PRICES)
+    catalog_cache.apply(result.pop("products"))
+    _add_timing(timings, "Запись в БД", time.perf_counter() - started)
+    return result
+
+
+def _add_timing(timings: dict, name: str, seconds: float):
+    timings[name] = timings.get(name, 0.0) + seconds
+
+
+def _stage_callback(on_stage: Optional[StageCallback]):
+    async def stage(name: str):
+        if on_stage is not None:
+            await on_stage(name)
+        return time.perf_counter()
+    return stage
+
+
+async def _download(bot, file_id: str, timings: dict, stage, label: str) -> bytearray:
+    started = await stage(label)
+    with span("ingest.download"):
+        file = await bot.get_file(file_id)
+        # Файл остаётся в памяти: парсер получает буфер напрямую, без записи на диск
+        data = await file.download_as_bytearray()
+    if SPOOL_UPLOADS:
+        extension = os.path.splitext(file.file_path or "")[1] or ".jpg"
+        await asyncio.get_running_loop().run_in_executor(None, _spool_to_disk, file.file_id + extension, data)
+    timings[label] = time.perf_counter() - started
+    return data
+
+
+async def ingest_catalog_photo(
+    bot,
+    file_id: str,
+    source_type: str,
+    on_stage: Optional[StageCallback] = None,
+) -> tuple:
+    """
+    Полный цикл загрузки фото каталога: скачивание → OCR/GPT → описания → БД.
+    on_stage(название) вызывается перед каждым этапом (для прогресса).
+    Возвращает (result, timings): result — счётчики upsert_products.
+    """
+    timings = {}
+    stage = _stage_callback(on_stage)
+    image_data = await _download(bot, file_id, timings, stage, "Загрузка фото")
+
+    started = await stage("Распознавание")
+    with span("ingest.recognize"):
+        products_data = await parse_catalog_with_tesseract(memoryview(image_data))
+    timings["Распознавание"] = time.perf_counter() - started
+
+    result = await store_products(products_data, source_type, timings, stage)
+    return result, timings
+
+
+async def ingest_catalog_pdf(
+    bot,
+    file_id: str,
+    source_type: str,
+    on_stage: Optional[StageCallback] = None,
+) -> tuple:
+    """
+    Загрузка многостраничного PDF-каталога. Страницы разбираются параллельно
+    (pdf_parser.py), товары каждой страницы пишутся в БД сразу по её готовности.
+    """
+    timings = {}
+    stage = _stage_callback(on_stage)
+    pdf_data = await _download(bot, file_id, timings, stage, "Загрузка PDF")
+
+    result = {"inserted": 0, "updated": 0, "skipped": 0}
+    done = 0
+    # Страницы сохраняются параллельно: общие счётчики и сообщения о прогрессе — под замком
+    lock = asyncio.Lock()
+
+    async def on_page(index: int, products_data: list):
+        nonlocal done
+        page_result = await store_products(products_data, source_type, {}, _stage_callback(None))
+        async with lock:
+            for key in result:
+                result[key] += page_result[key]
+            done += 1
+            if on_stage is not None:
+                await on_stage(f"Страницы: {done} готово, добавлено {result['inserted']}")
+
+    started = await stage("Страницы")
+    with span("ingest.pages"):
+        pages = await parse_pdf_catalog(pdf_data, on_page)
+    timings[f"Страницы ({pages} шт.)"] = time.perf_counter() - started
+
+    return result, timings
@@ -0,0 +1,172 @@
+import re
+from typing import Callable, List, Optional, Tuple
+
+# Цена и объём товара в тексте каталога; строка с ценой закрывает карточку товара.
+# Цена — либо с разделителями тысяч ("45,000원"), либо сплошным числом ("45000원")
+PRICE_PATTERN = r'(?<![\d.,])(\d{1,3}(?:,\d{3})+|\d{3,})\s*원'
+# Похоже на цену, но не разбирается PRICE_PATTERN (ошибка OCR): такую страницу отдаём GPT
+PRICE_HINT_PATTERN = r'\d[\d,.\s]*원'
+VOLUME_PATTERN = r'(\d+ml|\d+g|\d+\s*ml|\d+\s*g)'
+
+DEFAULT_BRAND = "Amore Pacific"
+
+
+def _vertices(box: dict) -> Optional[tuple]:
+    """(x0, y0, x1, y1) из boundingBox Yandex Vision (координаты приходят строками)"""
+    points = (box or {}).get("vertices") or []
+    xs = [int(p.get("x", 0)) for p in points]
+    ys = [int(p.get("y", 0)) for p in points]
+    if not xs or not ys:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def lines_from_detection(entry: dict) -> List[dict]:
+    """
+    Строки одного изображения из ответа textDetection вместе с геометрией:
+    {"text", "box": (x0, y0, x1, y1) или None, "confidence"}.
+    """
+    lines = []
+    for result in entry.get("results", []):
+        for page in result.get("textDetection", {}).get("pages", []):
+            for block in page.get("blocks", []):
+                for line in block.get("lines", []):
+                    words = line.get("words", [])
+                    text = " ".join(word.get("text", "") for word in words).strip()
+                    if not text:
+                        continue
+                    confidences = [float(word["confidence"]) for word in words if "confidence" in word]
+                    lines.append({
+                        "text": text,
+                        "box": _vertices(line.get("boundingBox")),
+                        "confidence": sum(confidences) / len(confidences) if confidences else 1.0,
+                    })
+    return lines
+
+
+def lines_from_text(text: str) -> List[dict]:
+    """Строки без геометрии (текстовый слой PDF) — разбираются как одна колонка"""
+    return [{"text": line.strip(), "box": None, "confidence": 1.0} for line in text.split("\n") if line.strip()]
+
+
+def _spans_columns(line: dict, lines: List[dict]) -> bool:
+    """Строка накрывает хотя бы две строки, не пересекающиеся между собой по горизонтали"""
+    x0, _, x1, _ = line["box"]
+    covered = [
+        other["box"] for other in lines
+        if other is not line
+        and min(x1, other["box"][2]) - max(x0, other["box"][0]) > 0.5 * (other["box"][2] - other["box"][0])
+    ]
+    return len(covered) > 1 and min(box[2] for box in covered) <= max(box[0] for box in covered)
+
+
+def _columns(lines: List[dict]) -> List[List[dict]]:
+    """
+    Группирует строки в колонки по перекрытию по горизонтали; внутри колонки — сверху вниз.
+    Строки через несколько колонок (заголовки во всю ширину) ни в одну колонку не попадают.
+    """
+    if any(line["box"] is None for line in lines):
+        return [lines]
+    columns = []  # [x0, x1, строки]
+    for line in sorted(lines, key=lambda l: (l["box"][1], l["box"][0])):
+        x0, _, x1, _ = line["box"]
+        if _spans_columns(line, lines):
+            continue
+        for column in columns:
+            overlap = min(x1, column[1]) - max(x0, column[0])
+            if overlap > 0.5 * min(x1 - x0, column[1] - column[0]):
+                column[0], column[1] = min(x0, column[0]), max(x1, column[1])
+                column[2].append(line)
+                break
+        else:
+            columns.append([x0, x1, [line]])
+    return [column[2] for column in sorted(columns, key=lambda c: c[0])]
+
+
+def _card_to_product(card: List[dict], normalize: Callable[[str], str]) -> Tuple[Optional[dict], float]:
+    """Товар из карточки (строки до строки с ценой включительно) и оценка 0..1"""
+    name_lines, volume, price = [], None, None
+    for line in card:
+        text = normalize(line["text"])
+        price_match = re.search(PRICE_PATTERN, text)
+        if price_match:
+            try:
+                price = int(price_match.group(1).replace(",", ""))
+            except ValueError:
+                price = None
+            continue
+        # Объём ищем и в исходном тексте: preprocess_text превращает "ml" в "m1"
+        volume_match = re.search(VOLUME_PATTERN, line["text"]) or re.search(VOLUME_PATTERN, text)
+        if volume_match and not volume:
+            volume = volume_match.group(1).strip()
+        # В названии — исходный текст: замены preprocess_text (O→0, I→1) портят латиницу
+        name = re.sub(VOLUME_PATTERN, "", line["text"]).strip(" ,/-")
+        if name:
+            name_lines.append(name)
+
+    if price is None or not 5000 <= price <= 1_500_000:
+        return None, 0.0
+    name = " ".join(name_lines[-2:])
+    if len(re.findall(r'[^\W\d_]', name)) < 2:
+        return None, 0.0
+
+    score = 1.0
+    if not volume:
+        score *= 0.9
+    if len(name_lines) > 2:
+        # Лишние строки над названием — заголовок раздела или склеенные карточки
+        score *= 0.7
+    refill = "(리필)" in name or "refill" in name.lower()
+    product = {
+        "brand": DEFAULT_BRAND,
+        "product": name.replace("(리필)", "").replace("Refill", "").strip(),
+        "volume": volume or "",
+        "price_krw": price,
+        "refill": refill,
+    }
+    return product, score
+
+
+def parse_layout(lines: List[dict], normalize: Callable[[str], str] = lambda text: text) -> Tuple[list, float]:
+    """
+    Локальный разбор страницы каталога по строкам с координатами: строки группируются
+    в колонки, колонка режется на карточки по строкам с ценой. Возвращает (товары,
+    уверенность 0..1); уверенность учитывает долю разобранного текста, полноту карточек
+    и уверенность OCR. normalize — исправление ошибок OCR перед поиском цены и объёма.
+    Если хотя бы одна цена или карточка не разобрана, уверенность 0: товар не должен
+    молча потеряться, страницу разберёт GPT.
+    """
+    total_chars = sum(len(line["text"]) for line in lines)
+    if not total_chars:
+        return [], 0.0
+
+    products, scores, used_chars = [], [], 0
+    for column in _columns(lines):
+        cards, current = [], []
+        for line in column:
+            text = normalize(line["text"])
+            if re.search(PRICE_HINT_PATTERN, text) and not re.search(PRICE_PATTERN, text):
+                return [], 0.0
+            is_volume_only = re.fullmatch(VOLUME_PATTERN, line["text"]) or re.fullmatch(VOLUME_PATTERN, text)
+            if is_volume_only and not current and cards:
+                cards[-1].append(line)
+                continue
+            current.append(line)
+            if re.search(PRICE_PATTERN, text):
+                cards.append(current)
+                current = []
+
+        for card in cards:
+            product, score = _card_to_product(card, normalize)
+            if product is None:
+                return [], 0.0
+            scores.append(score)
+            products.append(product)
+            used_chars += sum(len(line["text"]) for line in card)
+
+    if not scores:
+        return [], 0.0
+    coverage = used_chars / total_chars
+    ocr_confidence = sum(line["confidence"] for line in lines) / len(lines)
+    confidence = sum(scores) / len(scores) * coverage * ocr_confidence
+    return products, confidence
@@ -1,23 +1,31 @@
 import logging
-import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
-from config import BOT_TOKEN, ADMIN_IDS
-from database import Session, init_db
-from models import Product, User
-from vision_parser import parse_catalog_with_tesseract
-from ai_description import generate_description_yandex
-from price_utils import convert_krw_to_rub_with_discount_and_markup
-import os
-import json
-import base64
+from config import BOT_TOKEN, ADMIN_IDS, MINI_APP_URL, BOT_MODE, UPDATE_CONCURRENCY
+from database import init_db
+import repository
+from catalog_cache import catalog_cache
+from cart_store import cart_store
+from catalog_snapshot import get_snapshot_id
+from ingest_jobs import ingest_queue, format_job
+from file_id_cache import send_cached_document
+from broadcast import broadcaster, BROADCAST_TEMPLATES
+from http_client import close_session
+from pdf_parser import shutdown_pdf_pool
+from ocr_cache import ocr_cache
+from description_cache import description_cache
+from translation import translation_memory
+from resilience import endpoint_stats
+from scheduler import scheduler
+from metrics import registry as metrics_registry
 
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-user_cart = {}
 user_states = {}
 UPLOAD_STATE = {}
+# media_group_id альбома → source_type: /upload_photo действует на все фото альбома
+MEDIA_GROUPS = {}
 
 PICKUP_OPTIONS = ["СДЭК", "Почта РФ", "Ozon", "AliExpress"]
 PICKUP_ADDRESSES = {
@@ -31,9 +39,7 @@ IS_COLLECTION_OPEN = True
 # --- START ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    session = Session()
-    user = session.query(User).filter_by(telegram_id=user_id).first()
-    session.close()
+    user = await repository.get_user(user_id)
 
     # Обработка deep link: добавление товара
     text = update.message.text.strip()
@@ -43,18 +49,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             payload = parts[1]
             if payload.startswith("add_"):
                 article = payload.split("add_")[-1]
-                session = Session()
-                product = session.query(Product).filter_by(article=article).first()
-                session.close()
+                product = await catalog_cache.get_by_article(article)
 
                 if not product:
                     await update.message.reply_text("❌ Товар не найден.")
                     return
 
-                cart = user_cart.setdefault(user_id, [])
-                if article not in [p["article"] for p in cart]:
-                    cart.append({"product": product, "quantity": 1, "article": article})
-                    await update.message.reply_text(f"✅ *{product.name_en}* добавлен в корзину.", parse_mode="Markdown")
+                if await cart_store.add(user_id, product["article"], product["price"]):
+                    await update.message.reply_text(f"✅ *{product['name_en']}* добавлен в корзину.", parse_mode="Markdown")
                 else:
                     await update.message.reply_text("🛒 Уже в корзине!")
                 return
@@ -79,11 +81,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if user_id in user_states:
         if user_states[user_id] == "awaiting_name":
-            session = Session()
-            user = User(telegram_id=user_id, name=text)
-            session.add(user)
-            session.commit()
-            session.close()
+            await repository.upsert_user(user_id, name=text)
 
             keyboard = [[InlineKeyboardButton(option, callback_data=f"delivery_{option}")] for option in PICKUP_OPTIONS]
             await update.message.reply_text("🚚 Выберите способ доставки:", reply_markup=InlineKeyboardMarkup(keyboard))
@@ -103,13 +101,11 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if data.startswith("delivery_"):
         method = data.split("_", 1)[1]
-        session = Session()
-        user = session.query(User).filter_by(telegram_id=user_id).first()
-        if user:
-            user.delivery_method = method
-            user.pickup_address = PICKUP_ADDRESSES[method]
-            session.commit()
-        session.close()
+        await repository.update_user(
+            user_id,
+            delivery_method=method,
+            pickup_address=PICKUP_ADDRESSES[method]
+        )
         await query.edit_message_text(
             f"✅ Способ доставки: *{method}*\n"
             f"📦 Адрес: {PICKUP_ADDRESSES[method]}\n\n"
@@ -124,32 +120,40 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         try:
             path = "output/catalog.html"
-            with open(path, "r", encoding="utf-8") as f:
-                await context.bot.send_document(chat_id=user_id, document=f, filename="Каталог.html")
+            await send_cached_document(context.bot, user_id, path, filename="Каталог.html")
             await context.bot.send_message(user_id, "✅ HTML-каталог отправлен.")
         except Exception as e:
             await context.bot.send_message(user_id, f"❌ Ошибка: {e}")
 
     elif data.startswith("add_to_cart_"):
         article = data.split("_")[-1]
-        session = Session()
-        product = session.query(Product).filter_by(article=article).first()
-        session.close()
+        product = await catalog_cache.get_by_article(article)
 
         if not product:
             await query.edit_message_text("❌ Товар не найден.")
             return
 
-        cart = user_cart.setdefault(user_id, [])
-        if article not in [p["article"] for p in cart]:
-            cart.append({"product": product, "quantity": 1, "article": article})
+        if await cart_store.add(user_id, product["article"], product["price"]):
             await query.edit_message_text(
-                f"✅ *{product.name_en}* добавлен в корзину.\nИспользуйте /cart",
+                f"✅ *{product['name_en']}* добавлен в корзину.\nИспользуйте /cart",
                 parse_mode="Markdown"
             )
         else:
             await query.edit_message_text("🛒 Уже в корзине!")
 
+    elif data.startswith("broadcast_"):
+        if user_id not in ADMIN_IDS:
+            return
+        text = BROADCAST_TEMPLATES.get(data.split("_", 1)[1])
+        if not text:
+            return
+        broadcast_id = await broadcaster.create(text, admin_chat_id=user_id)
+        await query.edit_message_text(f"📣 Рассылка #{broadcast_id} запущена. Итог придёт сообщением.")
+
+    elif data == "clear_cart":
+        await cart_store.clear(user_id)
+        await query.edit_message_text("🛒 Корзина очищена.")
+
 # --- ЗАГРУЗКА ФОТО ---
 async def upload_photo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -171,89 +175,94 @@ async def upload_type_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     if data == "upload_korean":
         UPLOAD_STATE[user_id] = "korean_catalog"
-        await query.edit_message_text("📸 Пришлите фото корейского каталога.")
+        await query.edit_message_text("📸 Пришлите фото или PDF корейского каталога.")
     elif data == "upload_excel":
         UPLOAD_STATE[user_id] = "excel_catalog"
         await query.edit_message_text("📸 Пришлите фото Excel-таблицы (цены в RUB).")
 
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    photo = update.message.photo[-1]
+    await enqueue_upload(update, photo.file_id, kind="photo", label="Фото")
+
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await enqueue_upload(update, update.message.document.file_id, kind="pdf", label="PDF")
+
+async def enqueue_upload(update: Update, file_id: str, kind: str, label: str):
     user_id = update.effective_user.id
     if user_id not in ADMIN_IDS:
         await update.message.reply_text("❌ Только админ.")
         return
-    if user_id not in UPLOAD_STATE:
+    media_group_id = update.message.media_group_id
+    if media_group_id in MEDIA_GROUPS:
+        source_type = MEDIA_GROUPS[media_group_id]
+    elif user_id in UPLOAD_STATE:
+        source_type = UPLOAD_STATE.pop(user_id)
+        if media_group_id:
+            MEDIA_GROUPS[media_group_id] = source_type
+            while len(MEDIA_GROUPS) > 100:
+                MEDIA_GROUPS.pop(next(iter(MEDIA_GROUPS)))
+    else:
         await update.message.reply_text("Сначала используйте /upload_photo")
         return
 
-    source_type = UPLOAD_STATE.pop(user_id)
-    photo = update.message.photo[-1]
-    file = await context.bot.get_file(photo.file_id)
-    file_path = f"uploads/{file.file_id}.jpg"
-    os.makedirs("uploads", exist_ok=True)
-    await file.download_to_drive(file_path)
-
-    try:
-        products_data = await parse_catalog_with_tesseract(file_path)
-        added = 0
-        session = Session()
-
-        for item in products_data:
-            existing = session.query(Product).filter_by(article=item["article"]).first()
-            if existing:
-                continue
-
-            if source_type == "excel_catalog":
-                price_rub = item["price_krw"]  # Уже в RUB
-            else:
-                price_rub = convert_krw_to_rub_with_discount_and_markup(
-                    item["price_krw"],
-                    is_korean_catalog=True
-                )
-
-            description = await generate_description_yandex(
-                brand=item["brand"],
-                product=item["product"],
-                volume=item.get("volume", "")
-            )
+    # Обработка идёт в фоне (ingest_jobs.py); здесь только ставим задачу в очередь
+    progress = await update.message.reply_text(f"📥 {label} получено, ставлю в очередь…")
+    job_id = await ingest_queue.enqueue(
+        user_id=user_id,
+        chat_id=update.effective_chat.id,
+        file_id=file_id,
+        source_type=source_type,
+        progress_message_id=progress.message_id,
+        kind=kind,
+    )
+    await progress.edit_text(
+        f"🕓 Задача #{job_id} в очереди (перед ней: {ingest_queue.depth() - 1}).\n"
+        "Статус: /jobs"
+    )
+
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    counts = await repository.count_jobs_by_status()
+    jobs = await repository.list_jobs(limit=10)
+
+    text = (
+        "📋 Очередь загрузки\n"
+        f"В очереди: {ingest_queue.depth()}, в работе: {ingest_queue.running()}\n"
+        f"Выполнено: {counts.get('done', 0)}, с ошибкой: {counts.get('failed', 0)}\n\n"
+    )
+    text += "\n".join(format_job(job) for job in jobs) if jobs else "Задач пока нет."
+    await update.message.reply_text(text)
+
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    snapshot = metrics_registry.snapshot()
+    if not snapshot["histograms"] and not snapshot["counters"]:
+        await update.message.reply_text("📊 Метрик пока нет (или METRICS_ENABLED=0).")
+        return
 
-            product = Product()
-            product.article = item["article"]
-            product.name = item["product"]
-            product.name_en = item["product"]
-            product.brand = item["brand"]
-            product.price = price_rub
-            product.description = description
-            product.volume = item.get("volume", "")
-            product.category = "Крема"
-            product.country = "Корея"
-            product.in_stock = 10
-
-            session.add(product)
-            added += 1
-
-        session.commit()
-        session.close()
-        await update.message.reply_text(f"✅ Добавлено: {added} товаров")
-    except Exception as e:
-        logger.error(f"Ошибка: {e}")
-        await update.message.reply_text(f"❌ Ошибка: {e}")
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    lines = ["📊 Метрики с момента запуска"]
+    for name, h in sorted(snapshot["histograms"].items()):
+        lines.append(f"• {name}: {h['count']}×, ср. {h['avg']:.2f} с, p95 ≤ {h['p95']:.2f} с, макс. {h['max']:.2f} с")
+    if snapshot["counters"]:
+        lines.append("")
+        lines.extend(f"• {name}: {value}" for name, value in sorted(snapshot["counters"].items()))
+    await update.message.reply_text("\n".join(lines))
 
 # --- КОРЗИНА ---
 async def cart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cart = user_cart.get(update.effective_user.id, [])
+    cart = await cart_store.items(update.effective_user.id)
     if not cart:
         await update.message.reply_text("🛒 Ваша корзина пуста.")
         return
 
-    total = sum(item["quantity"] * item["product"].price for item in cart)
+    total = sum(qty * price for _, qty, price in cart)
     message = "🛒 *Ваша корзина*\n\n"
-    for i, item in enumerate(cart, 1):
-        p = item["product"]
-        qty = item["quantity"]
-        message += f"{i}. {p.name_en}\n   {qty} × {p.price:,} ₽ = {(qty * p.price):,} ₽\n"
+    for i, (article, qty, price) in enumerate(cart, 1):
+        p = await catalog_cache.get_by_article(article)
+        name = p["name_en"] if p else article
+        message += f"{i}. {name}\n   {qty} × {price:,} ₽ = {(qty * price):,} ₽\n"
     message += f"\n*Итого: {total:,} ₽*"
 
     keyboard = [[InlineKeyboardButton("Очистить корзину", callback_data="clear_cart")]]
@@ -261,31 +270,14 @@ async def cart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- MINI APP: /catalog ---
 async def send_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    products = session.query(Product).all()
-    session.close()
+    snapshot_id = await get_snapshot_id()
 
-    if not products:
+    if not snapshot_id:
         await update.message.reply_text("❌ В базе нет товаров.")
         return
 
-    data = []
-    for p in products:
-        data.append({
-            "id": p.id,
-            "article": p.article,
-            "name": p.name_en or p.name,
-            "brand": p.brand,
-            "volume": p.volume or "",
-            "price": p.price,
-            "description": p.description or ""
-        })
-
-    json_str = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
-    encoded = base64.urlsafe_b64encode(json_str.encode('utf-8')).decode('ascii')
-
-    # Замените на ваш GitHub Pages URL
-    url = f"https://johngar1312-hue.github.io/korea-catalog-miniapp?data={encoded}"
+    # Mini App загружает снапшот из api_server.py по id
+    url = f"{MINI_APP_URL}?snapshot={snapshot_id}"
 
     keyboard = [[InlineKeyboardButton("📱 Открыть каталог", web_app=WebAppInfo(url=url))]]
     await update.message.reply_text("📂 Откройте каталог в Mini App:", reply_markup=InlineKeyboardMarkup(keyboard))
@@ -296,9 +288,41 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     kb = [
         [InlineKeyboardButton("📤 Сгенерировать HTML-каталог", callback_data="generate_catalog")],
+        [InlineKeyboardButton("📣 Рассылка: новый каталог", callback_data="broadcast_new_catalog")],
+        [InlineKeyboardButton("📣 Рассылка: закупка закрывается", callback_data="broadcast_closing")],
         [InlineKeyboardButton("🚫 Закрыть закупку", callback_data="close_collection")]
     ]
-    await update.message.reply_text("⚙️ Админ-панель", reply_markup=InlineKeyboardMarkup(kb))
+    stats = catalog_cache.stats()
+    ocr_stats = ocr_cache.stats()
+    description_stats = description_cache.stats()
+    translation_stats = translation_memory.stats()
+    text = (
+        "⚙️ Админ-панель\n\n"
+        f"🗂 Кэш каталога: v{stats['version']}, товаров {stats['products']}\n"
+        f"   попаданий {stats['hits']}, промахов {stats['misses']} ({stats['hit_rate']:.0%})\n"
+        f"🔍 Кэш OCR: попаданий {ocr_stats['hits']} (+{ocr_stats['near_hits']} похожих), "
+        f"промахов {ocr_stats['misses']} ({ocr_stats['hit_rate']:.0%})\n"
+        f"📝 Кэш описаний: попаданий {description_stats['hits']}, "
+        f"промахов {description_stats['misses']} ({description_stats['hit_rate']:.0%})\n"
+        f"🌐 Переводы: по глоссарию {translation_stats['glossary_hits']}, "
+        f"из памяти {translation_stats['memory_hits']}, моделью {translation_stats['translated']}"
+    )
+    for name, endpoint in endpoint_stats().items():
+        if not endpoint["requests"]:
+            continue
+        latency = " / ".join(
+            f"{endpoint[p]:.1f}" if endpoint[p] is not None else "—" for p in ("p50", "p95", "p99")
+        )
+        text += (
+            f"\n📡 {name}: p50/p95/p99 {latency} с, запросов {endpoint['requests']}, "
+            f"ошибок {endpoint['errors']}, повторов {endpoint['retried']}, цепь {endpoint['circuit']}"
+        )
+    scheduler_stats = scheduler.stats()
+    text += f"\n🚦 Планировщик: в работе {scheduler_stats['in_flight']}"
+    for name, queue in scheduler_stats["classes"].items():
+        wait = f"{queue['p95']:.1f}" if queue["p95"] is not None else "—"
+        text += f", {name}: в очереди {queue['queued']}, ожидание p95 {wait} с"
+    await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(kb))
 
 async def close_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global IS_COLLECTION_OPEN
@@ -307,25 +331,51 @@ async def close_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text("🛑 Закупка закрыта.")
 
 # --- ЗАПУСК ---
+async def on_startup(app: Application):
+    await cart_store.start()
+    await ingest_queue.start(app.bot)
+    await broadcaster.start(app.bot)
+
+async def on_shutdown(app: Application):
+    await broadcaster.stop()
+    await ingest_queue.stop()
+    await cart_store.stop()
+    await close_session()
+    shutdown_pdf_pool()
+
 def main():
     init_db()
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(UPDATE_CONCURRENCY)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("catalog", send_catalog))
     app.add_handler(CommandHandler("cart", cart_command))
     app.add_handler(CommandHandler("admin", admin))
     app.add_handler(CommandHandler("upload_photo", upload_photo_command))
+    app.add_handler(CommandHandler("jobs", jobs_command))
+    app.add_handler(CommandHandler("metrics", metrics_command))
 
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    app.add_handler(MessageHandler(filters.Document.PDF, handle_document))
 
     app.add_handler(CallbackQueryHandler(close_collection, pattern="^close_collection$"))
     app.add_handler(CallbackQueryHandler(upload_type_handler, pattern="^upload_"))
     app.add_handler(CallbackQueryHandler(button_handler))
 
     logger.info("✅ Бот запущен. Mini App активирован.")
-    app.run_polling()
+    if BOT_MODE == "webhook":
+        from webhook_server import run_webhook
+        run_webhook(app)
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
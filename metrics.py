@@ -0,0 +1,181 @@
+import bisect
+import contextvars
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержек, мс
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Верхняя граница корзины, в которую попадает квантиль q (сек)"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS_MS[index] / 1000, self.max) if index < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": self.max,
+        }
+
+
+class Registry:
+    """Счётчики и гистограммы задержек за всё время работы процесса"""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def incr(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+        }
+
+
+class Trace:
+    """Спаны одной задачи (например, загрузки каталога): этап → число вызовов и суммарное время"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.spans: Dict[str, list] = {}
+        self.counters: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float):
+        span = self.spans.setdefault(name, [0, 0.0])
+        span[0] += 1
+        span[1] += seconds
+
+    def summary(self) -> dict:
+        spans = sorted(self.spans.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            "spans": {name: {"count": count, "seconds": round(seconds, 3)} for name, (count, seconds) in spans},
+            "counters": dict(self.counters),
+        }
+
+
+registry = Registry()
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        registry.observe(self.name, seconds)
+        if exc_type is not None:
+            registry.incr(f"{self.name}.errors")
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, seconds)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({
+                "span": self.name,
+                "ms": round(seconds * 1000, 1),
+                "trace": trace.label if trace else None,
+                "error": exc_type.__name__ if exc_type else None,
+            }, ensure_ascii=False))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """
+    Замер этапа: `with span("vision"): ...` — работает и вокруг await.
+    Время попадает в гистограмму процесса и в текущий Trace задачи.
+    При METRICS_ENABLED=0 возвращает общий пустой объект без замеров.
+    """
+    return _Span(name) if METRICS_ENABLED else _NOOP
+
+
+def incr(name: str, value: int = 1):
+    if not METRICS_ENABLED:
+        return
+    registry.incr(name, value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + value
+
+
+class job_trace:
+    """
+    Контекст задачи: спаны и счётчики внутри него (в том числе в задачах asyncio,
+    созданных внутри — они наследуют contextvars) собираются в один Trace.
+    """
+
+    def __init__(self, label: str):
+        self.trace = Trace(label)
+        self._token = None
+
+    def __enter__(self) -> Trace:
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        if METRICS_ENABLED:
+            logger.info(json.dumps({"trace": self.trace.label, **self.trace.summary()}, ensure_ascii=False))
+        return False
+
+
+def format_summary(summary: dict, limit: int = 5) -> str:
+    """Самые долгие спаны одной строкой: "vision 2×1.3с · yandexgpt 3×4.1с" """
+    spans = list(summary.get("spans", {}).items())[:limit]
+    return " · ".join(f"{name} {span['count']}×{span['seconds']:.1f}с" for name, span in spans)
@@ -1,15 +1,23 @@
-kdocument.addEventListener('DOMContentLoaded', () => {
+const API_BASE = 'http://158.160.133.167:5000';
+
+document.addEventListener('DOMContentLoaded', () => {
     const urlParams = new URLSearchParams(window.location.search);
+    const snapshot_id = urlParams.get('snapshot');
     const session_id = urlParams.get('session');
     const productsContainer = document.getElementById('products');
 
-    if (!session_id) {
+    if (!snapshot_id && !session_id) {
         productsContainer.innerHTML = '<p>❌ Не указана сессия. Откройте через Telegram бота.</p>';
         return;
     }
 
-    console.log('Session ID:', session_id);
-    fetch(`http://158.160.133.167:5000/api/products?session=${session_id}`)
+    // Снапшот каталога неизменяем и кэшируется браузером; сессии — старый формат
+    const dataUrl = snapshot_id
+        ? `${API_BASE}/api/catalog/${encodeURIComponent(snapshot_id)}`
+        : `${API_BASE}/api/products?session=${encodeURIComponent(session_id)}`;
+
+    console.log('Источник данных:', dataUrl);
+    fetch(dataUrl)
         .then(response => {
             if (!response.ok) throw new Error(`Сетевая ошибка: ${response.status}`);
             return response.json();
@@ -45,7 +53,7 @@ kdocument.addEventListener('DOMContentLoaded', () => {
             productsContainer.innerHTML = `
                 <p>❌ Ошибка загрузки:</p>
                 <pre>${error.message}</pre>
-                <p><a href="http://158.160.133.167:5000/api/products?session=${session_id}" target="_blank">👉 Проверить данные вручную</a></p>
+                <p><a href="${dataUrl}" target="_blank">👉 Проверить данные вручную</a></p>
             `;
         });
 });
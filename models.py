@@ -51,4 +51,87 @@ class Order(Base):
     created_at = Column(DateTime, default=func.now())
 
     user = relationship("User", back_populates="orders")
-    product = relationship("Product", back_populates="orders")
\ No newline at end of file
+    product = relationship("Product", back_populates="orders")
+
+
+class CartItem(Base):
+    __tablename__ = 'cart_items'
+    user_id = Column(Integer, primary_key=True)  # telegram_id пользователя
+    article = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=1)
+    price = Column(Integer, nullable=False)  # цена на момент добавления
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class IngestJob(Base):
+    __tablename__ = 'ingest_jobs'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)  # telegram_id админа
+    chat_id = Column(Integer, nullable=False)
+    file_id = Column(String, nullable=False)  # Telegram file_id: позволяет перезапустить задачу после рестарта
+    source_type = Column(String, nullable=False)  # korean_catalog, excel_catalog
+    kind = Column(String, default="photo")  # photo, pdf
+    status = Column(String, default="queued")  # queued, running, done, failed
+    stage = Column(String)
+    progress_message_id = Column(Integer)
+    timings = Column(String)  # JSON: этап → секунды
+    metrics = Column(String)  # JSON: сводка спанов и счётчиков задачи (metrics.py)
+    result = Column(String)  # JSON: inserted, updated, skipped
+    error = Column(String)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+    id = Column(Integer, primary_key=True)
+    text = Column(String, nullable=False)
+    admin_chat_id = Column(Integer)  # куда отправить итог
+    status = Column(String, default="running")  # running, done
+    last_user_id = Column(Integer, default=0)  # курсор: users.id последнего обработанного получателя
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime)
+
+
+class OcrCacheEntry(Base):
+    __tablename__ = 'ocr_cache'
+    content_hash = Column(String, primary_key=True)  # sha256 исходного изображения
+    phash = Column(String, index=True)  # перцептивный хэш (dHash, 16 hex) для поиска почти-дубликатов
+    raw_text = Column(String, nullable=False)
+    products = Column(String, nullable=False)  # JSON: результат извлечения товаров
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=func.now())
+    last_used_at = Column(DateTime, default=func.now())
+
+
+class DescriptionCacheEntry(Base):
+    __tablename__ = 'description_cache'
+    key = Column(String, primary_key=True)  # нормализованные бренд|название (и объём, если включено)
+    description = Column(String, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=func.now())  # от него считается TTL
+    last_used_at = Column(DateTime, default=func.now())
+
+
+class TranslationEntry(Base):
+    __tablename__ = 'translations'
+    source = Column(String, primary_key=True)  # нормализованный исходный текст (корейский)
+    translation = Column(String, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=func.now())
+
+
+class ArticleAlias(Base):
+    __tablename__ = 'article_aliases'
+    alias = Column(String, primary_key=True)  # прежний артикул (AP-100…), по нему ещё открываются старые ссылки
+    article = Column(String, nullable=False)  # текущий артикул товара
+
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    name = Column(String, primary_key=True)  # однократные миграции данных, выполненные в этой БД
+    applied_at = Column(DateTime, default=func.now())
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+from typing import Dict, Optional, Tuple
+
+import repository
+from config import OCR_CACHE_MAX_ENTRIES, OCR_CACHE_PHASH_DISTANCE
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def _dhash(data) -> Optional[str]:
+    """Перцептивный difference-hash 64 бита (16 hex); None без Pillow или при ошибке"""
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data)).convert("L").resize((9, 8), Image.LANCZOS)
+    except Exception:
+        return None
+    pixels = list(img.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def _fingerprint(data, with_phash: bool) -> Tuple[str, Optional[str]]:
+    content_hash = hashlib.sha256(data).hexdigest()
+    return content_hash, _dhash(data) if with_phash else None
+
+
+class OcrCache:
+    """
+    Персистентный кэш результатов OCR и извлечения товаров по хэшу содержимого фото.
+    При OCR_CACHE_PHASH_DISTANCE > 0 находит и почти-дубликаты (пересжатые/обрезанные
+    копии) по перцептивному хэшу. Размер ограничен OCR_CACHE_MAX_ENTRIES (LRU).
+    """
+
+    def __init__(self, max_entries: int = OCR_CACHE_MAX_ENTRIES, phash_distance: int = OCR_CACHE_PHASH_DISTANCE):
+        self.max_entries = max_entries
+        self.phash_distance = phash_distance
+        self._phashes: Optional[Dict[str, int]] = None  # content_hash → dHash
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    async def fingerprint(self, data) -> Tuple[str, Optional[str]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _fingerprint, data, self.phash_distance > 0)
+
+    async def lookup(self, content_hash: str, phash: Optional[str]) -> Optional[Tuple[str, list]]:
+        """(raw_text, products) из кэша или None"""
+        entry = await repository.get_ocr_entry(content_hash)
+        if entry is None and phash is not None:
+            near = await self._find_near(int(phash, 16))
+            if near is not None:
+                entry = await repository.get_ocr_entry(near)
+                if entry is not None:
+                    self.near_hits += 1
+                    logger.info(f"♻️ Кэш OCR: почти-дубликат {near[:12]}")
+                    return entry.raw_text, json.loads(entry.products)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.info(f"♻️ Кэш OCR: совпадение {content_hash[:12]}")
+        return entry.raw_text, json.loads(entry.products)
+
+    async def store(self, content_hash: str, phash: Optional[str], raw_text: str, products: list):
+        evicted = await repository.put_ocr_entry(
+            self.max_entries,
+            content_hash=content_hash,
+            phash=phash,
+            raw_text=raw_text,
+            products=json.dumps(products, ensure_ascii=False),
+        )
+        if self._phashes is not None:
+            if phash is not None:
+                self._phashes[content_hash] = int(phash, 16)
+            for key in evicted:
+                self._phashes.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / total if total else 0.0,
+        }
+
+    async def _find_near(self, phash: int) -> Optional[str]:
+        if self._phashes is None:
+            self._phashes = {k: int(v, 16) for k, v in (await repository.list_ocr_phashes()).items()}
+        best, best_distance = None, self.phash_distance + 1
+        for content_hash, other in self._phashes.items():
+            distance = bin(phash ^ other).count("1")
+            if distance < best_distance:
+                best, best_distance = content_hash, distance
+        return best
+
+
+ocr_cache = OcrCache()
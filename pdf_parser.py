@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+import pdf_render
+from config import PDF_PAGE_CONCURRENCY, PDF_RENDER_DPI, PDF_RENDER_PROCESSES, PDF_TEXT_MIN_CHARS
+from layout_parser import lines_from_text
+from vision_parser import detect_lines_on_image, extract_products_from_lines
+
+logger = logging.getLogger(__name__)
+
+# PyMuPDF не потокобезопасен, поэтому растеризация идёт в пуле процессов (pdf_render.py):
+# каждый процесс держит свой открытый документ, страницы рендерятся параллельно.
+# Параллельно с ними выполняются сетевые этапы (OCR и GPT) других страниц.
+_PDF_POOL: Optional[ProcessPoolExecutor] = None
+
+PageCallback = Callable[[int, list], Awaitable[None]]
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _PDF_POOL
+    if _PDF_POOL is None:
+        _PDF_POOL = ProcessPoolExecutor(max_workers=max(1, PDF_RENDER_PROCESSES))
+    return _PDF_POOL
+
+
+def shutdown_pdf_pool():
+    global _PDF_POOL
+    if _PDF_POOL is not None:
+        _PDF_POOL.shutdown(wait=False, cancel_futures=True)
+        _PDF_POOL = None
+
+
+def _write_temp_pdf(data: bytes) -> str:
+    """PDF во временный файл: воркеры открывают его по пути, а не получают байты на каждую страницу"""
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="catalog_")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+async def _run(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(), fn, *args)
+
+
+async def parse_pdf_page(path: str, index: int) -> list:
+    kind, content = await _run(pdf_render.extract_page, path, index, PDF_TEXT_MIN_CHARS, PDF_RENDER_DPI)
+    if kind == "text":
+        # Текстовый слой без ошибок OCR — preprocess_text здесь только испортил бы буквы
+        products = await extract_products_from_lines([lines_from_text(content)], from_ocr=False)
+    else:
+        products = await extract_products_from_lines(await detect_lines_on_image(content))
+    logger.info(f"✅ PDF, страница {index + 1} ({kind}): {len(products)} товаров")
+    return products
+
+
+async def parse_pdf_catalog(
+    data,
+    on_page: PageCallback,
+    concurrency: int = PDF_PAGE_CONCURRENCY,
+) -> int:
+    """
+    Разбирает PDF-каталог постранично, не более concurrency страниц одновременно.
+    on_page(номер страницы, товары) вызывается внутри задачи страницы сразу после её
+    разбора, поэтому товары (и их описания) попадают в БД, не дожидаясь остальных
+    страниц. Возвращает число страниц.
+    """
+    if pdf_render.pymupdf is None:
+        raise RuntimeError("Для PDF установите PyMuPDF: pip install pymupdf")
+
+    loop = asyncio.get_running_loop()
+    path = await loop.run_in_executor(None, _write_temp_pdf, bytes(data))
+    try:
+        return await _parse_pages(path, on_page, concurrency)
+    finally:
+        os.remove(path)
+
+
+async def _parse_pages(path: str, on_page: PageCallback, concurrency: int) -> int:
+    count = await _run(pdf_render.page_count, path)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def process(index: int):
+        async with semaphore:
+            try:
+                products = await parse_pdf_page(path, index)
+            except Exception as e:
+                logger.error(f"❌ PDF, страница {index + 1}: {e}")
+                products = []
+            await on_page(index, products)
+
+    await asyncio.gather(*(process(i) for i in range(count)))
+    return count
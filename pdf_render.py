@@ -0,0 +1,45 @@
+"""
+Работа с PyMuPDF в процессах-воркерах pdf_parser. Модуль намеренно лёгкий:
+только PyMuPDF, без бота и БД. Каждый процесс открывает документ один раз
+и держит его открытым для следующих страниц того же файла.
+"""
+from collections import OrderedDict
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+# Открытые документы процесса: путь → документ. Больше одного — если
+# несколько PDF-каталогов загружаются одновременно
+MAX_OPEN_DOCUMENTS = 2
+_documents: "OrderedDict[str, object]" = OrderedDict()
+
+
+def _open(path: str):
+    doc = _documents.get(path)
+    if doc is None:
+        doc = _documents[path] = pymupdf.open(path)
+        while len(_documents) > MAX_OPEN_DOCUMENTS:
+            _, oldest = _documents.popitem(last=False)
+            oldest.close()
+    else:
+        _documents.move_to_end(path)
+    return doc
+
+
+def page_count(path: str) -> int:
+    return _open(path).page_count
+
+
+def extract_page(path: str, index: int, min_chars: int, dpi: int) -> tuple:
+    """('text', str) — если у страницы есть текстовый слой, иначе ('image', JPEG для OCR)"""
+    page = _open(path)[index]
+    text = page.get_text().strip()
+    if len(text) >= min_chars:
+        return "text", text
+    pixmap = page.get_pixmap(dpi=dpi)
+    return "image", pixmap.tobytes("jpeg")
@@ -0,0 +1,456 @@
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import SessionLocal
+from models import (
+    ArticleAlias, Broadcast, CartItem, DescriptionCacheEntry, IngestJob, OcrCacheEntry, Product, TranslationEntry,
+    User,
+)
+
+# Все запросы к SQLite выполняются в одном выделенном потоке:
+# event loop бота не блокируется, а запись в SQLite и так сериализуется.
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+async def run_in_db(fn, *args, **kwargs):
+    """Выполняет синхронную функцию fn(*args, **kwargs) в потоке БД"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_DB_EXECUTOR, partial(fn, *args, **kwargs))
+
+
+def _with_session(fn):
+    """Открывает сессию на время вызова; объекты остаются доступны после закрытия"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = SessionLocal(expire_on_commit=False)
+        try:
+            return fn(session, *args, **kwargs)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    return wrapper
+
+
+# --- ТОВАРЫ ---
+@_with_session
+def _get_product_by_article(session, article: str) -> Optional[Product]:
+    return session.query(Product).filter_by(article=article).first()
+
+
+@_with_session
+def _list_products(session) -> List[Product]:
+    return session.query(Product).order_by(Product.id).all()
+
+
+@_with_session
+def _list_article_aliases(session) -> Dict[str, str]:
+    return {row.alias: row.article for row in session.query(ArticleAlias).all()}
+
+
+def _query_existing_prices(session, articles: List[str]) -> Dict[str, int]:
+    if not articles:
+        return {}
+    rows = session.query(Product.article, Product.price).filter(Product.article.in_(articles)).all()
+    return {article: price for article, price in rows}
+
+
+_find_existing_prices = _with_session(_query_existing_prices)
+
+
+@_with_session
+def _upsert_products(session, rows: List[dict], update_prices: bool) -> dict:
+    # Дубликаты артикулов внутри пачки: побеждает последняя строка
+    by_article = {row["article"]: row for row in rows}
+    articles = list(by_article)
+    existing = _query_existing_prices(session, articles)
+
+    to_write, inserted, updated = [], 0, 0
+    for article, row in by_article.items():
+        if article not in existing:
+            to_write.append(row)
+            inserted += 1
+        elif update_prices and existing[article] != row["price"]:
+            to_write.append(row)
+            updated += 1
+    skipped = len(rows) - inserted - updated
+
+    products = []
+    if to_write:
+        # Все столбцы должны совпадать для multi-VALUES INSERT
+        columns = set().union(*(row.keys() for row in to_write))
+        values = [{col: row.get(col) for col in columns} for row in to_write]
+        stmt = sqlite_insert(Product).values(values)
+        if update_prices:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Product.article],
+                set_={"price": stmt.excluded.price}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[Product.article])
+        session.execute(stmt)
+        session.commit()
+        written = [row["article"] for row in to_write]
+        products = session.query(Product).filter(Product.article.in_(written)).all()
+
+    return {"inserted": inserted, "updated": updated, "skipped": skipped, "products": products}
+
+
+async def get_product_by_article(article: str) -> Optional[Product]:
+    return await run_in_db(_get_product_by_article, article)
+
+
+async def list_products() -> List[Product]:
+    return await run_in_db(_list_products)
+
+
+async def list_article_aliases() -> Dict[str, str]:
+    """Прежние артикулы → текущие (после перехода на артикулы из содержимого)"""
+    return await run_in_db(_list_article_aliases)
+
+
+async def find_existing_prices(articles: Iterable[str]) -> Dict[str, int]:
+    """Один IN-запрос: article → текущая цена для уже известных товаров"""
+    return await run_in_db(_find_existing_prices, list(articles))
+
+
+async def upsert_products(rows: Iterable[dict], update_prices: bool = False) -> dict:
+    """
+    Пакетная загрузка товаров с upsert по products.article одним INSERT.
+    Новые товары добавляются; у существующих при update_prices обновляется цена.
+    Возвращает {"inserted", "updated", "skipped", "products"}; products — записанные строки.
+    """
+    return await run_in_db(_upsert_products, list(rows), update_prices)
+
+
+# --- ПОЛЬЗОВАТЕЛИ ---
+@_with_session
+def _get_user(session, telegram_id: int) -> Optional[User]:
+    return session.query(User).filter_by(telegram_id=telegram_id).first()
+
+
+@_with_session
+def _upsert_user(session, telegram_id: int, **fields) -> User:
+    user = session.query(User).filter_by(telegram_id=telegram_id).first()
+    if user is None:
+        user = User(telegram_id=telegram_id)
+        session.add(user)
+    for key, value in fields.items():
+        setattr(user, key, value)
+    session.commit()
+    return user
+
+
+@_with_session
+def _update_user(session, telegram_id: int, **fields) -> bool:
+    user = session.query(User).filter_by(telegram_id=telegram_id).first()
+    if user is None:
+        return False
+    for key, value in fields.items():
+        setattr(user, key, value)
+    session.commit()
+    return True
+
+
+@_with_session
+def _list_active_recipients(session, after_id: int, limit: int) -> List[Tuple[int, int]]:
+    rows = (
+        session.query(User.id, User.telegram_id)
+        .filter(User.id > after_id, User.is_active.is_(True))
+        .order_by(User.id)
+        .limit(limit)
+        .all()
+    )
+    return [(user_id, telegram_id) for user_id, telegram_id in rows]
+
+
+async def get_user(telegram_id: int) -> Optional[User]:
+    return await run_in_db(_get_user, telegram_id)
+
+
+async def upsert_user(telegram_id: int, **fields) -> User:
+    """Создаёт пользователя или обновляет поля существующего"""
+    return await run_in_db(_upsert_user, telegram_id, **fields)
+
+
+async def update_user(telegram_id: int, **fields) -> bool:
+    """Обновляет поля пользователя. False — если пользователь не найден"""
+    return await run_in_db(_update_user, telegram_id, **fields)
+
+
+async def list_active_recipients(after_id: int, limit: int) -> List[Tuple[int, int]]:
+    """Страница активных пользователей после курсора: (users.id, telegram_id)"""
+    return await run_in_db(_list_active_recipients, after_id, limit)
+
+
+# --- КОРЗИНЫ ---
+@_with_session
+def _load_cart(session, user_id: int) -> List[Tuple[str, int, int]]:
+    rows = session.query(CartItem).filter_by(user_id=user_id).order_by(text("rowid")).all()
+    return [(r.article, r.quantity, r.price) for r in rows]
+
+
+@_with_session
+def _save_carts(session, carts: Dict[int, List[Tuple[str, int, int]]]) -> None:
+    session.query(CartItem).filter(CartItem.user_id.in_(list(carts))).delete(synchronize_session=False)
+    session.add_all(
+        CartItem(user_id=user_id, article=article, quantity=qty, price=price)
+        for user_id, items in carts.items()
+        for article, qty, price in items
+    )
+    session.commit()
+
+
+async def load_cart(user_id: int) -> List[Tuple[str, int, int]]:
+    """Позиции корзины: (article, quantity, price)"""
+    return await run_in_db(_load_cart, user_id)
+
+
+async def save_carts(carts: Dict[int, List[Tuple[str, int, int]]]) -> None:
+    """Полностью перезаписывает корзины переданных пользователей одной транзакцией"""
+    await run_in_db(_save_carts, carts)
+
+
+# --- ЗАДАЧИ ЗАГРУЗКИ КАТАЛОГА ---
+@_with_session
+def _create_job(session, **fields) -> IngestJob:
+    job = IngestJob(**fields)
+    session.add(job)
+    session.commit()
+    return job
+
+
+@_with_session
+def _get_job(session, job_id: int) -> Optional[IngestJob]:
+    return session.get(IngestJob, job_id)
+
+
+@_with_session
+def _update_job(session, job_id: int, **fields) -> None:
+    session.query(IngestJob).filter_by(id=job_id).update(fields)
+    session.commit()
+
+
+@_with_session
+def _list_jobs(session, limit: int) -> List[IngestJob]:
+    return session.query(IngestJob).order_by(IngestJob.id.desc()).limit(limit).all()
+
+
+@_with_session
+def _count_jobs_by_status(session) -> Dict[str, int]:
+    rows = session.query(IngestJob.status, func.count(IngestJob.id)).group_by(IngestJob.status).all()
+    return dict(rows)
+
+
+@_with_session
+def _requeue_interrupted_jobs(session) -> List[int]:
+    session.query(IngestJob).filter_by(status="running").update({"status": "queued"})
+    session.commit()
+    rows = session.query(IngestJob.id).filter_by(status="queued").order_by(IngestJob.id).all()
+    return [job_id for job_id, in rows]
+
+
+async def create_job(**fields) -> IngestJob:
+    return await run_in_db(_create_job, **fields)
+
+
+async def get_job(job_id: int) -> Optional[IngestJob]:
+    return await run_in_db(_get_job, job_id)
+
+
+async def update_job(job_id: int, **fields) -> None:
+    await run_in_db(_update_job, job_id, **fields)
+
+
+async def list_jobs(limit: int = 10) -> List[IngestJob]:
+    """Последние задачи, новые первыми"""
+    return await run_in_db(_list_jobs, limit)
+
+
+async def count_jobs_by_status() -> Dict[str, int]:
+    return await run_in_db(_count_jobs_by_status)
+
+
+async def requeue_interrupted_jobs() -> List[int]:
+    """Возвращает в очередь задачи, прерванные рестартом; id ожидающих задач по порядку"""
+    return await run_in_db(_requeue_interrupted_jobs)
+
+
+# --- РАССЫЛКИ ---
+@_with_session
+def _create_broadcast(session, **fields) -> Broadcast:
+    broadcast = Broadcast(**fields)
+    session.add(broadcast)
+    session.commit()
+    return broadcast
+
+
+@_with_session
+def _get_broadcast(session, broadcast_id: int) -> Optional[Broadcast]:
+    return session.get(Broadcast, broadcast_id)
+
+
+@_with_session
+def _update_broadcast(session, broadcast_id: int, **fields) -> None:
+    session.query(Broadcast).filter_by(id=broadcast_id).update(fields)
+    session.commit()
+
+
+@_with_session
+def _list_running_broadcast_ids(session) -> List[int]:
+    rows = session.query(Broadcast.id).filter_by(status="running").order_by(Broadcast.id).all()
+    return [broadcast_id for broadcast_id, in rows]
+
+
+async def create_broadcast(**fields) -> Broadcast:
+    return await run_in_db(_create_broadcast, **fields)
+
+
+async def get_broadcast(broadcast_id: int) -> Optional[Broadcast]:
+    return await run_in_db(_get_broadcast, broadcast_id)
+
+
+async def update_broadcast(broadcast_id: int, **fields) -> None:
+    await run_in_db(_update_broadcast, broadcast_id, **fields)
+
+
+async def list_running_broadcast_ids() -> List[int]:
+    return await run_in_db(_list_running_broadcast_ids)
+
+
+# --- КЭШ OCR ---
+@_with_session
+def _get_ocr_entry(session, content_hash: str) -> Optional[OcrCacheEntry]:
+    entry = session.get(OcrCacheEntry, content_hash)
+    if entry is not None:
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = datetime.datetime.now()
+        session.commit()
+    return entry
+
+
+@_with_session
+def _list_ocr_phashes(session) -> Dict[str, str]:
+    rows = session.query(OcrCacheEntry.content_hash, OcrCacheEntry.phash).filter(OcrCacheEntry.phash.isnot(None)).all()
+    return dict(rows)
+
+
+@_with_session
+def _put_ocr_entry(session, max_entries: int, **fields) -> List[str]:
+    fields.setdefault("last_used_at", datetime.datetime.now())
+    session.merge(OcrCacheEntry(**fields))
+    session.commit()
+    # LRU: удаляем самые давно использованные записи сверх лимита
+    stale = (
+        session.query(OcrCacheEntry.content_hash)
+        .order_by(OcrCacheEntry.last_used_at.desc())
+        .offset(max_entries)
+        .all()
+    )
+    evicted = [content_hash for content_hash, in stale]
+    if evicted:
+        session.query(OcrCacheEntry).filter(OcrCacheEntry.content_hash.in_(evicted)).delete(synchronize_session=False)
+        session.commit()
+    return evicted
+
+
+async def get_ocr_entry(content_hash: str) -> Optional[OcrCacheEntry]:
+    """Запись кэша OCR; обращение обновляет last_used_at"""
+    return await run_in_db(_get_ocr_entry, content_hash)
+
+
+async def list_ocr_phashes() -> Dict[str, str]:
+    return await run_in_db(_list_ocr_phashes)
+
+
+async def put_ocr_entry(max_entries: int, **fields) -> List[str]:
+    """Сохраняет запись кэша OCR; возвращает хэши вытесненных записей"""
+    return await run_in_db(_put_ocr_entry, max_entries, **fields)
+
+
+# --- КЭШ ОПИСАНИЙ ---
+@_with_session
+def _get_descriptions(session, keys: List[str], fresh_after: datetime.datetime) -> Dict[str, str]:
+    entries = (
+        session.query(DescriptionCacheEntry)
+        .filter(DescriptionCacheEntry.key.in_(keys), DescriptionCacheEntry.created_at >= fresh_after)
+        .all()
+    )
+    now = datetime.datetime.now()
+    for entry in entries:
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = now
+    session.commit()
+    return {entry.key: entry.description for entry in entries}
+
+
+@_with_session
+def _put_descriptions(session, descriptions: Dict[str, str], max_entries: int) -> int:
+    now = datetime.datetime.now()
+    for key, description in descriptions.items():
+        session.merge(DescriptionCacheEntry(key=key, description=description, created_at=now, last_used_at=now))
+    session.commit()
+    # LRU: удаляем самые давно использованные записи сверх лимита
+    stale = (
+        session.query(DescriptionCacheEntry.key)
+        .order_by(DescriptionCacheEntry.last_used_at.desc())
+        .offset(max_entries)
+        .all()
+    )
+    evicted = [key for key, in stale]
+    if evicted:
+        session.query(DescriptionCacheEntry).filter(DescriptionCacheEntry.key.in_(evicted)).delete(synchronize_session=False)
+        session.commit()
+    return len(evicted)
+
+
+async def get_descriptions(keys: Iterable[str], fresh_after: datetime.datetime) -> Dict[str, str]:
+    """Описания из кэша не старше fresh_after одним IN-запросом; обращение обновляет last_used_at"""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    return await run_in_db(_get_descriptions, keys, fresh_after)
+
+
+async def put_descriptions(descriptions: Dict[str, str], max_entries: int) -> int:
+    """Сохраняет описания в кэш; возвращает число вытесненных записей"""
+    if not descriptions:
+        return 0
+    return await run_in_db(_put_descriptions, descriptions, max_entries)
+
+
+# --- ПАМЯТЬ ПЕРЕВОДОВ ---
+@_with_session
+def _get_translations(session, sources: List[str]) -> Dict[str, str]:
+    entries = session.query(TranslationEntry).filter(TranslationEntry.source.in_(sources)).all()
+    for entry in entries:
+        entry.hits = (entry.hits or 0) + 1
+    session.commit()
+    return {entry.source: entry.translation for entry in entries}
+
+
+@_with_session
+def _put_translations(session, translations: Dict[str, str]) -> None:
+    for source, translation in translations.items():
+        session.merge(TranslationEntry(source=source, translation=translation))
+    session.commit()
+
+
+async def get_translations(sources: Iterable[str]) -> Dict[str, str]:
+    """Сохранённые переводы одним IN-запросом: нормализованный текст → перевод"""
+    sources = list(dict.fromkeys(sources))
+    if not sources:
+        return {}
+    return await run_in_db(_get_translations, sources)
+
+
+async def put_translations(translations: Dict[str, str]) -> None:
+    if translations:
+        await run_in_db(_put_translations, translations)
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import aiohttp
+
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, YANDEX_BACKOFF_BASE, YANDEX_BACKOFF_MAX,
+    YANDEX_GPT_TIMEOUT, YANDEX_HEDGE, YANDEX_RETRIES, YANDEX_VISION_TIMEOUT,
+)
+from http_client import get_session
+from metrics import incr, span
+from scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Фабрика аргументов session.post (headers, json / data). Вызывается на каждую попытку:
+# потоковое тело запроса нельзя отправить второй раз, его нужно построить заново
+RequestFactory = Callable[[], dict]
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+HEDGE_MIN_SAMPLES = 20
+
+
+class YandexError(Exception):
+    """Ответ Yandex Cloud с кодом, отличным от 200"""
+
+    def __init__(self, endpoint: str, status: int, text: str = "", retry_after: Optional[float] = None):
+        super().__init__(f"{endpoint}: HTTP {status} {text}".strip())
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+class CircuitOpenError(Exception):
+    """Эндпоинт недоступен: circuit breaker разомкнут, запрос не отправлялся"""
+
+
+class InvalidResponseError(Exception):
+    """Ответ 200, тело которого не удалось разобрать как JSON — считается сбоем сервиса"""
+
+
+class LatencyStats:
+    """Задержки последних успешных запросов и их перцентили"""
+
+    def __init__(self, window: int = 500):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold ошибок подряд размыкается и reset_timeout секунд
+    отклоняет запросы сразу. Затем пропускает один пробный запрос: успех замыкает
+    цепь, ошибка снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def release_trial(self):
+        """Пробный запрос прерван без результата (отмена): следующий вызов сможет стать пробным"""
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial:
+                logger.warning(f"⚡ Circuit breaker разомкнут на {self.reset_timeout:.0f} с")
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class Endpoint:
+    """
+    Эндпоинт Yandex Cloud: собственный таймаут, повторы с экспоненциальной
+    задержкой и джиттером на 429/5xx и сетевые ошибки, circuit breaker,
+    опциональное хеджирование и статистика задержек.
+    """
+
+    def __init__(self, name: str, url: str, timeout: float, retries: int = YANDEX_RETRIES,
+                 hedge: bool = YANDEX_HEDGE):
+        self.name = name
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.hedge = hedge
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyStats()
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+        self.hedged = 0
+        self.rejected = 0
+        ENDPOINTS[name] = self
+
+    async def post(self, request: RequestFactory) -> dict:
+        """JSON ответа 200; иначе YandexError / CircuitOpenError / сетевая ошибка после всех попыток"""
+        with span(f"yandex.{self.name}"):
+            return await self._post(request)
+
+    def stats(self) -> dict:
+        return {
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+            "p99": self.latency.percentile(99),
+            "requests": self.requests,
+            "errors": self.errors,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "rejected": self.rejected,
+            "circuit": self.breaker.state,
+        }
+
+    # --- ВНУТРЕННЕЕ ---
+    async def _post(self, request: RequestFactory) -> dict:
+        tokens = scheduler.tokens_for(self.name, request)
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.rejected += 1
+                incr(f"yandex.{self.name}.rejected")
+                raise CircuitOpenError(f"{self.name}: сервис временно недоступен")
+            self.requests += 1
+            retry_after = None
+            try:
+                result = await self._hedged(request, tokens)
+            except YandexError as e:
+                if not e.retryable:
+                    # Ошибка запроса, а не сервиса: цепь не размыкаем и не повторяем
+                    self.breaker.record_success()
+                    self.errors += 1
+                    incr(f"yandex.{self.name}.errors")
+                    raise
+                error, retry_after = e, e.retry_after
+                if e.status == 429:
+                    # Квота общая для всех вызовов модели: притормаживаем всех, а не только этот запрос
+                    scheduler.throttle(self.name, self._backoff(attempt, retry_after))
+            except (asyncio.TimeoutError, aiohttp.ClientError, InvalidResponseError) as e:
+                error = e
+            except asyncio.CancelledError:
+                self.breaker.release_trial()
+                raise
+            except BaseException:
+                # Любая другая ошибка — тоже сбой: иначе пробный запрос half-open так и не завершится
+                # и цепь останется разомкнутой навсегда
+                self.errors += 1
+                incr(f"yandex.{self.name}.errors")
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+            self.errors += 1
+            incr(f"yandex.{self.name}.errors")
+            self.breaker.record_failure()
+            if attempt == self.retries:
+                raise error
+            delay = self._backoff(attempt, retry_after)
+            self.retried += 1
+            incr(f"yandex.{self.name}.retries")
+            reason = f"HTTP {error.status}" if isinstance(error, YandexError) else str(error) or type(error).__name__
+            logger.warning(f"🔁 {self.name}: {reason}, повтор {attempt + 1}/{self.retries} через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # "Full jitter": случайная задержка до base·2^attempt, чтобы повторы не шли волной
+        delay = random.uniform(0, min(YANDEX_BACKOFF_MAX, YANDEX_BACKOFF_BASE * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, YANDEX_BACKOFF_MAX))
+        return delay
+
+    async def _attempt(self, request: RequestFactory, tokens: int = 0) -> dict:
+        await scheduler.acquire(self.name, tokens)
+        try:
+            started = time.perf_counter()
+            session = await get_session()
+            async with session.post(self.url, timeout=self.timeout, **request()) as resp:
+                if resp.status != 200:
+                    text = (await resp.text())[:200]
+                    raise YandexError(self.name, resp.status, text, _parse_retry_after(resp.headers.get("Retry-After")))
+                try:
+                    result = await resp.json()
+                except ValueError as e:
+                    raise InvalidResponseError(f"{self.name}: некорректный JSON в ответе 200: {e}") from e
+        finally:
+            scheduler.release(self.name)
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, request: RequestFactory, tokens: int = 0) -> dict:
+        """Если ответа нет дольше p95, параллельно отправляется второй такой же запрос; побеждает первый успешный"""
+        if not self.hedge or len(self.latency.samples) < HEDGE_MIN_SAMPLES:
+            return await self._attempt(request, tokens)
+
+        pending = {asyncio.create_task(self._attempt(request, tokens))}
+        done, pending = await asyncio.wait(pending, timeout=self.latency.percentile(95))
+        if not done:
+            self.hedged += 1
+            incr(f"yandex.{self.name}.hedged")
+            pending.add(asyncio.create_task(self._attempt(request, tokens)))
+        try:
+            error = None
+            while done or pending:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def endpoint_stats() -> Dict[str, dict]:
+    return {name: endpoint.stats() for name, endpoint in ENDPOINTS.items()}
+
+
+ENDPOINTS: Dict[str, Endpoint] = {}
+
+yandex_vision = Endpoint(
+    "vision", "https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze", timeout=YANDEX_VISION_TIMEOUT
+)
+yandex_gpt = Endpoint(
+    "yandexgpt", "https://llm.api.cloud.yandex.net/foundationModels/v1/completion", timeout=YANDEX_GPT_TIMEOUT
+)
@@ -0,0 +1,193 @@
+import asyncio
+import bisect
+import contextvars
+import itertools
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from config import (
+    YANDEX_GPT_CONCURRENCY, YANDEX_GPT_RPS, YANDEX_GPT_TPM, YANDEX_MAX_CONCURRENCY,
+    YANDEX_VISION_CONCURRENCY, YANDEX_VISION_RPS,
+)
+from metrics import Histogram, span
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета: меньше — раньше. interactive (по умолчанию) — распознавание каталогов,
+# загруженных админами: OCR и извлечение товаров. backfill — массовая фоновая работа:
+# генерация описаний (ai_description.generate_descriptions), переводы названий
+# (translation.py) и поиск картинок по каталогу (image_search.find_image_urls)
+PRIORITIES = {"interactive": 0, "backfill": 1}
+DEFAULT_PRIORITY = "interactive"
+
+# Грубая оценка токенов по длине текста: кириллица и хангыль — около 3 символов на токен
+CHARS_PER_TOKEN = 3
+
+_current_priority: contextvars.ContextVar = contextvars.ContextVar("scheduler_priority", default=DEFAULT_PRIORITY)
+
+
+class priority:
+    """
+    Класс приоритета для вызовов внутри контекста: `with priority("backfill"): ...`.
+    Наследуется задачами asyncio, созданными внутри (contextvars).
+    """
+
+    def __init__(self, name: str):
+        if name not in PRIORITIES:
+            raise ValueError(f"Неизвестный приоритет: {name}")
+        self.name = name
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_priority.set(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_priority.reset(self._token)
+        return False
+
+
+class ModelLimits:
+    """Лимиты одной модели: одновременные запросы, запросы в секунду, токены в минуту (0 — без ограничения)"""
+
+    def __init__(self, concurrency: int, rps: float = 0, tpm: float = 0):
+        self.concurrency = concurrency
+        self.rps = TokenBucket(rps) if rps > 0 else None
+        self.tpm = TokenBucket(tpm / 60, capacity=tpm) if tpm > 0 else None
+        self.in_flight = 0
+
+
+def estimate_tokens(body: Optional[dict]) -> int:
+    """Токены запроса к YandexGPT: текст сообщений плюс зарезервированный maxTokens ответа"""
+    if not body:
+        return 0
+    chars = sum(len(message.get("text", "")) for message in body.get("messages", []))
+    max_tokens = int(body.get("completionOptions", {}).get("maxTokens", 0))
+    return chars // CHARS_PER_TOKEN + max_tokens
+
+
+class Scheduler:
+    """
+    Общий планировщик вызовов Yandex Cloud. Слот выдаётся, когда есть место и в общем
+    лимите, и в лимите модели; ожидающие обслуживаются по приоритету, внутри
+    класса — по очереди. После слота запрос ждёт бюджеты RPS и TPM модели.
+    """
+
+    def __init__(self, max_concurrency: int = YANDEX_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.models: Dict[str, ModelLimits] = {}
+        self.in_flight = 0
+        self._queue: list = []  # (приоритет, номер, модель, future), отсортирован
+        self._seq = itertools.count()
+        self._waits: Dict[str, Histogram] = {name: Histogram() for name in PRIORITIES}
+
+    def register(self, model: str, concurrency: int, rps: float = 0, tpm: float = 0):
+        self.models[model] = ModelLimits(concurrency, rps, tpm)
+
+    def tokens_for(self, model: str, request: Callable[[], dict]) -> int:
+        """Оценка токенов запроса — только если у модели есть бюджет TPM (иначе тело не строим)"""
+        limits = self.models.get(model)
+        if limits is None or limits.tpm is None:
+            return 0
+        return estimate_tokens(request().get("json"))
+
+    async def acquire(self, model: str, tokens: int = 0) -> float:
+        """Ждёт слот и бюджеты модели; возвращает время ожидания. После запроса — release(model)"""
+        name = _current_priority.get()
+        started = time.monotonic()
+        with span(f"scheduler.wait.{name}"):
+            if self._can_run(model):
+                self._take(model)
+            else:
+                await self._enqueue(name, model)
+            try:
+                limits = self.models.get(model)
+                if limits is not None and limits.rps is not None:
+                    await limits.rps.acquire()
+                if limits is not None and limits.tpm is not None and tokens:
+                    await limits.tpm.acquire(tokens)
+            except BaseException:
+                self.release(model)
+                raise
+        waited = time.monotonic() - started
+        self._waits[name].observe(waited)
+        return waited
+
+    def release(self, model: str):
+        self.in_flight -= 1
+        limits = self.models.get(model)
+        if limits is not None:
+            limits.in_flight -= 1
+        self._dispatch()
+
+    def throttle(self, model: str, seconds: float):
+        """После 429: приостанавливает выдачу запросов к модели на seconds секунд"""
+        limits = self.models.get(model)
+        if limits is not None and limits.rps is not None:
+            limits.rps.pause(seconds)
+            logger.warning(f"🐢 {model}: квота превышена, пауза {seconds:.1f} с")
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in PRIORITIES}
+        order = {level: name for name, level in PRIORITIES.items()}
+        for level, _, _, _ in self._queue:
+            queued[order[level]] += 1
+        return {
+            "in_flight": self.in_flight,
+            "models": {
+                model: {"in_flight": limits.in_flight, "concurrency": limits.concurrency}
+                for model, limits in self.models.items()
+            },
+            "classes": {
+                name: {"queued": queued[name], **self._waits[name].snapshot()}
+                for name in PRIORITIES
+            },
+        }
+
+    # --- ВНУТРЕННЕЕ ---
+    def _can_run(self, model: str) -> bool:
+        if self.in_flight >= self.max_concurrency:
+            return False
+        limits = self.models.get(model)
+        return limits is None or limits.in_flight < limits.concurrency
+
+    def _take(self, model: str):
+        self.in_flight += 1
+        limits = self.models.get(model)
+        if limits is not None:
+            limits.in_flight += 1
+
+    async def _enqueue(self, name: str, model: str):
+        future = asyncio.get_running_loop().create_future()
+        entry = (PRIORITIES[name], next(self._seq), model, future)
+        bisect.insort(self._queue, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но задача отменена до того, как им воспользовалась
+                self.release(model)
+            elif entry in self._queue:
+                self._queue.remove(entry)
+            raise
+
+    def _dispatch(self):
+        """Выдаёт освободившиеся слоты ожидающим: по приоритету, пропуская тех, чья модель занята"""
+        for entry in list(self._queue):
+            if self.in_flight >= self.max_concurrency:
+                break
+            _, _, model, future = entry
+            if future.done():
+                self._queue.remove(entry)
+                continue
+            if self._can_run(model):
+                self._queue.remove(entry)
+                self._take(model)
+                future.set_result(None)
+
+
+scheduler = Scheduler()
+scheduler.register("vision", YANDEX_VISION_CONCURRENCY, rps=YANDEX_VISION_RPS)
+scheduler.register("yandexgpt", YANDEX_GPT_CONCURRENCY, rps=YANDEX_GPT_RPS, tpm=YANDEX_GPT_TPM)
@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+import repository
+from ai_description import translate_batch_yandex, translate_korean_to_english
+from article_utils import normalize_text
+from config import TRANSLATION_BATCH_SIZE
+from scheduler import priority
+
+logger = logging.getLogger(__name__)
+
+HANGUL = re.compile("[\u1100-\u11ff\u3130-\u318f\uac00-\ud7a3]")
+
+# Дополнения и исправления глоссария без правки кода: {"корейский термин": "English"}
+GLOSSARY_FILE = "data/glossary.json"
+
+# Известные бренды и термины: название, целиком покрытое глоссарием, переводится без GPT
+GLOSSARY = {
+    # Бренды
+    "아모레퍼시픽": "Amorepacific",
+    "설화수": "Sulwhasoo",
+    "라네즈": "Laneige",
+    "이니스프리": "Innisfree",
+    "헤라": "Hera",
+    "마몽드": "Mamonde",
+    "아이오페": "IOPE",
+    "프리메라": "Primera",
+    "한율": "Hanyul",
+    "에스트라": "Aestura",
+    "일리윤": "Illiyoon",
+    "에뛰드": "Etude",
+    # Линейки и хиты
+    "자음생크림": "Concentrated Ginseng Rejuvenating Cream",
+    "자음생": "Concentrated Ginseng",
+    "윤조에센스": "First Care Activating Serum",
+    "워터뱅크": "Water Bank",
+    "립 슬리핑 마스크": "Lip Sleeping Mask",
+    "그린티": "Green Tea",
+    # Типы средств
+    "수분크림": "Moisture Cream",
+    "아이크림": "Eye Cream",
+    "선크림": "Sun Cream",
+    "크림": "Cream",
+    "세럼": "Serum",
+    "앰플": "Ampoule",
+    "앰풀": "Ampoule",
+    "에센스": "Essence",
+    "토너": "Toner",
+    "스킨": "Skin",
+    "로션": "Lotion",
+    "유액": "Emulsion",
+    "미스트": "Mist",
+    "마스크": "Mask",
+    "클렌징폼": "Cleansing Foam",
+    "클렌징 오일": "Cleansing Oil",
+    "오일": "Oil",
+    "쿠션": "Cushion",
+    "밤": "Balm",
+    "젤": "Gel",
+    "리필": "Refill",
+    "기획세트": "Special Set",
+    "선물세트": "Gift Set",
+    "세트": "Set",
+    "대용량": "Jumbo",
+}
+
+
+def _load_glossary() -> Dict[str, str]:
+    glossary = dict(GLOSSARY)
+    if os.path.exists(GLOSSARY_FILE):
+        try:
+            with open(GLOSSARY_FILE, "r", encoding="utf-8") as f:
+                glossary.update(json.load(f))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить глоссарий: {e}")
+    return glossary
+
+
+def _glossary_pattern(glossary: Dict[str, str]) -> re.Pattern:
+    # Длинные термины первыми: "수분크림" раньше "크림"
+    terms = sorted(glossary, key=len, reverse=True)
+    return re.compile("|".join(re.escape(term) for term in terms))
+
+
+class TranslationMemory:
+    """
+    Перевод корейских названий на английский: глоссарий → память процесса →
+    таблица translations → пакетный запрос к YandexGPT. Каждое уникальное
+    (после нормализации) название переводится моделью не больше одного раза.
+    """
+
+    def __init__(self, batch_size: int = TRANSLATION_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        self.glossary = _load_glossary()
+        self._pattern = _glossary_pattern(self.glossary)
+        self._memory: Dict[str, str] = {}
+        self.glossary_hits = 0
+        self.memory_hits = 0
+        self.translated = 0
+
+    def apply_glossary(self, text: str) -> Optional[str]:
+        """Перевод по глоссарию или None, если после замены остался корейский текст"""
+        translated = self._pattern.sub(lambda m: f" {self.glossary[m.group(0)]} ", text)
+        translated = re.sub(r"\s+", " ", translated).strip()
+        return None if HANGUL.search(translated) else translated
+
+    async def translate(self, text: str) -> str:
+        return (await self.translate_many([text]))[0]
+
+    async def translate_many(self, texts: Iterable[str]) -> List[str]:
+        """Переводы в порядке texts; все промахи уходят в модель пакетами по batch_size"""
+        texts = list(texts)
+        keys: List[Optional[str]] = []
+        pending: Dict[str, str] = {}  # ключ → исходный текст (первое вхождение)
+        for text in texts:
+            if not text or not HANGUL.search(text):
+                keys.append(None)
+                continue
+            key = normalize_text(text)
+            keys.append(key)
+            if key in self._memory:
+                self.memory_hits += 1
+                continue
+            glossed = self.apply_glossary(text)
+            if glossed is not None:
+                self.glossary_hits += 1
+                self._memory[key] = glossed
+                continue
+            pending.setdefault(key, text)
+
+        if pending:
+            stored = await repository.get_translations(pending)
+            self.memory_hits += len(stored)
+            self._memory.update(stored)
+            missing = {key: text for key, text in pending.items() if key not in stored}
+            if missing:
+                # Переводы нужны только для поиска картинок — фоновая работа
+                with priority("backfill"):
+                    translated = await self._translate_with_llm(missing)
+                self._memory.update(translated)
+                await repository.put_translations(translated)
+
+        return [
+            text if key is None else self._memory.get(key, text)
+            for text, key in zip(texts, keys)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "glossary_hits": self.glossary_hits,
+            "memory_hits": self.memory_hits,
+            "translated": self.translated,
+        }
+
+    async def _translate_with_llm(self, missing: Dict[str, str]) -> Dict[str, str]:
+        keys = list(missing)
+        translated: Dict[str, str] = {}
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            sources = [missing[key] for key in batch]
+            results = await translate_batch_yandex(sources) if len(batch) > 1 else [None]
+            for key, source, result in zip(batch, sources, results):
+                if result is None:
+                    result = await translate_korean_to_english(source)
+                # При сбое translate_korean_to_english возвращает исходный текст — такое не запоминаем
+                if result and result != source:
+                    translated[key] = result
+        self.translated += len(translated)
+        logger.info(f"🌐 Переведено моделью: {len(translated)} из {len(missing)} названий")
+        return translated
+
+
+translation_memory = TranslationMemory()
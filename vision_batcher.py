@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from config import VISION_BATCH_MAX, VISION_BATCH_MAX_BYTES, VISION_BATCH_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# send(images) → результат для каждого изображения в том же порядке (None — ошибка)
+BatchSender = Callable[[list], Awaitable[List[Optional[dict]]]]
+
+
+def encoded_size(image_data) -> int:
+    """Размер изображения в base64 — именно столько оно займёт в теле запроса"""
+    return 4 * ((len(image_data) + 2) // 3)
+
+
+class VisionBatcher:
+    """
+    Склеивает изображения, пришедшие в течение window секунд (альбомы Telegram,
+    фрагменты высоких скриншотов, страницы PDF), в один запрос batchAnalyze.
+    Пачка отправляется по таймеру или сразу при достижении max_items / max_bytes;
+    результаты раздаются обратно ожидающим вызовам submit().
+    """
+
+    def __init__(self, send: BatchSender, window: float = VISION_BATCH_WINDOW,
+                 max_items: int = VISION_BATCH_MAX, max_bytes: int = VISION_BATCH_MAX_BYTES):
+        self.send = send
+        self.window = window
+        self.max_items = max(1, max_items)
+        self.max_bytes = max_bytes
+        self._pending = []  # (image_data, future)
+        self._pending_bytes = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = set()
+        self.batches = 0
+        self.images = 0
+
+    async def submit(self, image_data) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        size = encoded_size(image_data)
+
+        if self._pending and self._pending_bytes + size > self.max_bytes:
+            self._flush()
+        self._pending.append((image_data, future))
+        self._pending_bytes += size
+
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch": self.images / self.batches if self.batches else 0.0,
+        }
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_bytes = self._pending, [], 0
+        task = asyncio.create_task(self._send(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: list):
+        self.batches += 1
+        self.images += len(batch)
+        if len(batch) > 1:
+            logger.info(f"📦 Vision: {len(batch)} изображений в одном запросе")
+        try:
+            results = await self.send([image_data for image_data, _ in batch])
+        except Exception as e:
+            logger.error(f"❌ Vision batch: {e}")
+            results = []
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(results[index] if index < len(results) else None)
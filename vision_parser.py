@@ -1,10 +1,21 @@
 import re
+import asyncio
 import logging
 import json
-import aiohttp
 import base64
 import os
-from config import YANDEX_API_KEY, YANDEX_FOLDER_ID
+from typing import Union
+from article_utils import make_article
+from config import (
+    GPT_CHUNK_CHARS, GPT_CHUNK_CONCURRENCY, GPT_MAX_TOKENS, LAYOUT_CONFIDENCE_THRESHOLD,
+    YANDEX_API_KEY, YANDEX_FOLDER_ID,
+)
+from image_preprocess import preprocess_for_ocr
+from metrics import incr, span
+from layout_parser import PRICE_PATTERN, VOLUME_PATTERN, lines_from_detection, parse_layout
+from resilience import yandex_gpt, yandex_vision
+from ocr_cache import ocr_cache
+from vision_batcher import VisionBatcher, encoded_size
 
 logger = logging.getLogger(__name__)
 
@@ -14,91 +25,142 @@ def is_gift_set(product_name: str, volume: str) -> bool:
     return any(keyword in product_name.lower() for keyword in korean_set_keywords) or "+" in volume
 
 
-async def detect_text_on_image(image_path: str) -> str:
-    print(f"🔍 [DEBUG] Проверяем путь: {image_path}")
+# Источник изображения: путь к файлу или байты в памяти (bytes / bytearray / memoryview)
+ImageSource = Union[str, bytes, bytearray, memoryview]
+
+# Кратно 3: base64 каждого куска кодируется без паддинга и склеивается без копий исходника
+B64_CHUNK_SIZE = 3 * 64 * 1024
+
+
+def _read_image_file(image_path: str) -> bytes:
     if not os.path.exists(image_path):
-        print(f"❌ [DEBUG] Файл не найден: {image_path}")
         logger.error(f"❌ Файл не найден: {image_path}")
-        return ""
+        return b""
 
     file_size = os.path.getsize(image_path)
-    print(f"✅ [DEBUG] Файл найден, размер: {file_size} байт")
+    logger.debug(f"🔍 Файл {image_path}: {file_size} байт")
     if file_size == 0:
-        print("❌ [DEBUG] Файл пуст")
-        return ""
+        logger.warning(f"⚠️ Файл пуст: {image_path}")
+        return b""
 
     try:
         with open(image_path, "rb") as f:
-            image_data = f.read()
-        if not image_data:
-            print("❌ [DEBUG] Данные изображения пусты")
-            return ""
-        encoded_image = base64.b64encode(image_data).decode("utf-8")
-        if len(encoded_image) < 100:
-            print("⚠️ [DEBUG] Подозрительно короткий base64")
-            return ""
+            return f.read()
     except Exception as e:
-        print(f"❌ [DEBUG] Ошибка при чтении: {e}")
-        return ""
+        logger.error(f"❌ Ошибка при чтении {image_path}: {e}")
+        return b""
 
-    headers = {"Authorization": f"Api-Key {YANDEX_API_KEY}"}
-    url = "https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze"
 
-    payload = {
-        "folderId": YANDEX_FOLDER_ID,
-        "analyze_specs": [
+def _load_image(source: ImageSource):
+    return _read_image_file(source) if isinstance(source, str) else memoryview(source)
+
+
+def lines_to_text(line_groups: list) -> str:
+    return "\n".join(line["text"] for lines in line_groups for line in lines)
+
+
+async def detect_lines_on_image(source: ImageSource) -> list:
+    """Строки с координатами (layout_parser.lines_from_detection) — отдельный список на каждый фрагмент"""
+    image_data = _load_image(source)
+    if not len(image_data):
+        logger.warning("⚠️ Данные изображения пусты")
+        return []
+
+    try:
+        with span("ocr.preprocess"):
+            tiles, _ = await preprocess_for_ocr(image_data)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось подготовить изображение, отправляем как есть: {e}")
+        tiles = [image_data]
+
+    line_groups = await asyncio.gather(*(_recognize_lines(tile) for tile in tiles))
+    return [lines for lines in line_groups if lines]
+
+
+def _build_vision_body(images: list) -> tuple:
+    """
+    Тело запроса batchAnalyze как последовательность кусков: JSON-обвязка и base64
+    картинок, кодируемый по частям прямо из memoryview (без промежуточных копий
+    изображений и без json.dumps огромной строки). Возвращает (chunks, content_length).
+    """
+    views = [memoryview(image_data) for image_data in images]
+    spec_head = {
+        "mimeType": "image/jpeg",
+        "features": [
             {
-                "content": encoded_image,
-                "mimeType": "image/jpeg",
-                "features": [
-                    {
-                        "type": "TEXT_DETECTION",
-                        "textDetectionConfig": {"languageCodes": ["ko", "en"]}
-                    }
-                ]
+                "type": "TEXT_DETECTION",
+                "textDetectionConfig": {"languageCodes": ["ko", "en"]}
             }
-        ]
+        ],
     }
+    prefix = ('{"folderId":' + json.dumps(YANDEX_FOLDER_ID) + ',"analyze_specs":[').encode("utf-8")
+    spec_prefix = (json.dumps(spec_head)[:-1] + ',"content":"').encode("utf-8")
+    spec_suffix = b'"}'
+    suffix = b']}'
+
+    def chunks():
+        yield prefix
+        for index, view in enumerate(views):
+            yield (b',' if index else b'') + spec_prefix
+            for offset in range(0, len(view), B64_CHUNK_SIZE):
+                yield base64.b64encode(view[offset:offset + B64_CHUNK_SIZE])
+            yield spec_suffix
+        yield suffix
+
+    content_length = len(prefix) + len(suffix) + sum(
+        len(spec_prefix) + encoded_size(view) + len(spec_suffix) for view in views
+    ) + max(0, len(views) - 1)
+    return chunks, content_length
+
+
+async def _recognize_lines(image_data) -> list:
+    if len(image_data) < 75:
+        logger.warning(f"⚠️ Подозрительно маленькое изображение: {len(image_data)} байт")
+        return []
+
+    with span("ocr.vision"):
+        entry = await _vision_batcher.submit(image_data)
+    if entry is None:
+        return []
+    if "error" in entry:
+        logger.error(f"❌ Yandex Vision: ошибка изображения: {entry['error']}")
+        return []
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                print(f"📡 [DEBUG] Статус ответа: {resp.status}")
-                if resp.status != 200:
-                    text = await resp.text()
-                    print(f"❌ [DEBUG] Ошибка: {text}")
-                    logger.error(f"❌ Yandex Vision: ошибка {resp.status}")
-                    return ""
-
-                result = await resp.json()
-                print(f"✅ [DEBUG] Успешный ответ")
-
-                try:
-                    text = extract_text_from_detection(result)
-                    logger.info(f"✅ Yandex Vision: извлечён текст:\n{text}")
-                    return text
-                except Exception as e:
-                    logger.error(f"❌ Ошибка при извлечении текста: {e}")
-                    return ""
+        lines = lines_from_detection(entry)
+        logger.info(f"✅ Yandex Vision: извлечён текст:\n{lines_to_text([lines])}")
+        return lines
     except Exception as e:
-        logger.error(f"❌ Ошибка при обращении к Yandex Vision: {e}")
-        return ""
+        logger.error(f"❌ Ошибка при извлечении текста: {e}")
+        return []
 
 
-def extract_text_from_detection(result: dict) -> str:
-    lines = []
+async def _post_vision_batch(images: list) -> list:
+    """Один запрос batchAnalyze на несколько изображений; результат для каждого или None"""
+    chunks, content_length = _build_vision_body(images)
+
+    async def body():
+        for chunk in chunks():
+            yield chunk
+
+    headers = {
+        "Authorization": f"Api-Key {YANDEX_API_KEY}",
+        "Content-Type": "application/json",
+        "Content-Length": str(content_length),
+    }
+
     try:
-        pages = result["results"][0]["results"][0]["textDetection"]["pages"]
-        for page in pages:
-            for block in page.get("blocks", []):
-                for line in block.get("lines", []):
-                    words = [word.get("text", "") for word in line.get("words", [])]
-                    line_text = " ".join(words).strip()
-                    if line_text:
-                        lines.append(line_text)
+        # Генератор тела одноразовый — при повторе resilience строит новый
+        result = await yandex_vision.post(lambda: {"headers": headers, "data": body()})
     except Exception as e:
-        logger.error(f"❌ Ошибка при извлечении текста: {e}")
-    return "\n".join(lines)
+        logger.error(f"❌ Ошибка при обращении к Yandex Vision: {e}")
+        return [None] * len(images)
+
+    entries = result.get("results", [])
+    return [entries[i] if i < len(entries) else None for i in range(len(images))]
+
+
+_vision_batcher = VisionBatcher(_post_vision_batch)
 
 
 def preprocess_text(text: str) -> str:
@@ -114,8 +176,6 @@ def preprocess_text(text: str) -> str:
 def extract_products_from_raw_lines(lines: list) -> list:
     products = []
     current = {}
-    price_pattern = r'(\d{3,}[,\d]*)\s*원'
-    volume_pattern = r'(\d+ml|\d+g|\d+\s*ml|\d+\s*g)'
 
     product_keywords = ["크림", "앰플", "세럼", "로션", "수분크림", "에센스", "앰풀", "스킨케어"]
 
@@ -138,12 +198,12 @@ def extract_products_from_raw_lines(lines: list) -> list:
             }
 
         if not current.get("volume"):
-            vol_match = re.search(volume_pattern, line)
+            vol_match = re.search(VOLUME_PATTERN, line)
             if vol_match:
                 current["volume"] = vol_match.group(1).strip()
 
         if not current.get("price_krw"):
-            price_match = re.search(price_pattern, line)
+            price_match = re.search(PRICE_PATTERN, line)
             if price_match:
                 price_str = price_match.group(1).replace(",", "").strip()
                 try:
@@ -158,7 +218,77 @@ def extract_products_from_raw_lines(lines: list) -> list:
     return products
 
 
+def split_text_into_chunks(text: str, max_chars: int = GPT_CHUNK_CHARS) -> list:
+    """
+    Делит OCR-текст на фрагменты не длиннее max_chars по границам товаров:
+    карточка заканчивается строкой с ценой (и строкой с одним объёмом сразу после неё),
+    поэтому товар никогда не разрезается между двумя запросами к GPT.
+    """
+    blocks, current = [], []
+    for line in (line.strip() for line in text.split('\n')):
+        if not line:
+            continue
+        is_volume_only = re.fullmatch(VOLUME_PATTERN, line) is not None
+        if is_volume_only and not current and blocks:
+            blocks[-1].append(line)
+            continue
+        current.append(line)
+        if re.search(PRICE_PATTERN, line):
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+
+    chunks, chunk, size = [], [], 0
+    for block in blocks:
+        block_size = sum(len(line) + 1 for line in block)
+        if chunk and size + block_size > max_chars:
+            chunks.append('\n'.join(chunk))
+            chunk, size = [], 0
+        chunk.extend(block)
+        size += block_size
+    if chunk:
+        chunks.append('\n'.join(chunk))
+    return chunks
+
+
 async def extract_product_data_with_gpt(text: str) -> list:
+    """
+    Фрагменты текста (split_text_into_chunks) разбираются GPT параллельно,
+    не более GPT_CHUNK_CONCURRENCY одновременно; результаты объединяются без дублей.
+    """
+    chunks = split_text_into_chunks(text)
+    if not chunks:
+        return []
+    semaphore = asyncio.Semaphore(max(1, GPT_CHUNK_CONCURRENCY))
+
+    async def extract(chunk: str) -> list:
+        async with semaphore:
+            return await _extract_chunk_with_gpt(chunk)
+
+    results = await asyncio.gather(*(extract(chunk) for chunk in chunks))
+    if len(chunks) > 1:
+        logger.info(f"🧩 GPT: {len(chunks)} фрагментов текста обработано параллельно")
+    return merge_products(results)
+
+
+def merge_products(results: list) -> list:
+    """
+    Объединяет списки товаров (фрагменты текста, фрагменты фото) и раздаёт артикулы.
+    Артикул выводится из бренда, названия и объёма (article_utils.make_article),
+    поэтому товар, повторённый на стыке фрагментов, отбрасывается как дубль.
+    """
+    merged, seen = [], set()
+    for item in (item for items in results for item in items):
+        item["article"] = make_article(item)
+        if item["article"] in seen:
+            continue
+        seen.add(item["article"])
+        merged.append(item)
+    return merged
+
+
+async def _extract_chunk_with_gpt(text: str) -> list:
     headers = {"Authorization": f"Api-Key {YANDEX_API_KEY}", "Content-Type": "application/json"}
 
     prompt = """
@@ -190,7 +320,7 @@ async def extract_product_data_with_gpt(text: str) -> list:
 
     payload = {
         "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt/latest",
-        "completionOptions": {"temperature": 0.3, "maxTokens": 1000},
+        "completionOptions": {"temperature": 0.3, "maxTokens": GPT_MAX_TOKENS},
         "messages": [
             {"role": "system", "text": prompt},
             {"role": "user", "text": text}
@@ -198,54 +328,85 @@ async def extract_product_data_with_gpt(text: str) -> list:
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-                headers=headers,
-                json=payload
-            ) as resp:
-                if resp.status != 200:
-                    logger.error(f"❌ GPT ошибка: {resp.status}")
-                    return []
-
-                result = await resp.json()
-                content = result["result"]["alternatives"][0]["message"]["text"].strip()
-                start, end = content.find('['), content.rfind(']') + 1
-                if start == -1:
-                    logger.error("❌ JSON не найден")
-                    lines = [line.strip() for line in text.split('\n') if line.strip()]
-                    return extract_products_from_raw_lines(lines)
-
-                json_text = content[start:end]
-                data = json.loads(json_text)
-                filtered_data = []
-                for item in data:
-                    if "price_krw" in item:
-                        try:
-                            price = int(str(item["price_krw"]).replace(",", "").strip())
-                            if 5000 <= price <= 1_500_000:
-                                item["price_krw"] = price
-                                # Генерируем артикул ЛИШЬ здесь — как строку
-                                item["article"] = f"AP-{len(filtered_data) + 100:03d}"
-                                filtered_data.append(item)
-                        except:
-                            continue
-                return filtered_data
+        result = await yandex_gpt.post(lambda: {"headers": headers, "json": payload})
+        content = result["result"]["alternatives"][0]["message"]["text"].strip()
+        start, end = content.find('['), content.rfind(']') + 1
+        if start == -1:
+            logger.error("❌ JSON не найден")
+            lines = [line.strip() for line in text.split('\n') if line.strip()]
+            return extract_products_from_raw_lines(lines)
+
+        json_text = content[start:end]
+        data = json.loads(json_text)
+        filtered_data = []
+        for item in data:
+            if "price_krw" in item:
+                try:
+                    price = int(str(item["price_krw"]).replace(",", "").strip())
+                    if 5000 <= price <= 1_500_000:
+                        item["price_krw"] = price
+                        filtered_data.append(item)
+                except:
+                    continue
+        return filtered_data
     except Exception as e:
         logger.error(f"❌ Ошибка в GPT: {e}")
         lines = [line.strip() for line in text.split('\n') if line.strip()]
         return extract_products_from_raw_lines(lines)
 
 
-async def parse_catalog_with_tesseract(image_path: str) -> list:
+async def extract_products_from_lines(line_groups: list, from_ocr: bool = True) -> list:
+    """
+    Товары из распознанных строк. Сначала локальный разбор по координатам
+    (layout_parser.py): при уверенности не ниже LAYOUT_CONFIDENCE_THRESHOLD
+    страница обходится без GPT. Иначе — extract_product_data_with_gpt.
+    from_ocr=False — текстовый слой PDF: исправления ошибок OCR не нужны.
+    """
+    normalize = preprocess_text if from_ocr else (lambda text: text)
+    with span("extract.layout"):
+        parsed = [parse_layout(lines, normalize) for lines in line_groups]
+    confidence = min((score for _, score in parsed), default=0.0)
+    if parsed and confidence >= LAYOUT_CONFIDENCE_THRESHOLD:
+        products = merge_products([items for items, _ in parsed])
+        incr("extract.layout_pages")
+        logger.info(f"⚡ Разбор без GPT (уверенность {confidence:.2f}): {len(products)} товаров")
+        return products
+
+    text = normalize(lines_to_text(line_groups))
+    if not text:
+        return []
+    incr("extract.gpt_pages")
+    logger.info(f"🤖 Уверенность локального разбора {confidence:.2f} — отправляем в GPT")
+    with span("extract.gpt"):
+        return await extract_product_data_with_gpt(text)
+
+
+async def parse_catalog_with_tesseract(source: ImageSource) -> list:
     try:
-        raw_text = await detect_text_on_image(image_path)
+        image_data = _load_image(source)
+        if not len(image_data):
+            return []
+
+        # Повторно присланное фото: берём OCR и товары из кэша без запросов к Yandex
+        with span("ocr.cache_lookup"):
+            content_hash, phash = await ocr_cache.fingerprint(image_data)
+            cached = await ocr_cache.lookup(content_hash, phash)
+        if cached is not None:
+            # Артикулы пересчитываются: в старых записях кэша они были порядковыми
+            products = merge_products([cached[1]])
+            incr("ocr.cache_hits")
+            logger.info(f"✅ Из кэша: {len(products)} товаров")
+            return products
+
+        line_groups = await detect_lines_on_image(image_data)
+        raw_text = lines_to_text(line_groups)
         if not raw_text:
             return []
 
-        clean_text = preprocess_text(raw_text)
-        products = await extract_product_data_with_gpt(clean_text)
+        products = await extract_products_from_lines(line_groups)
         logger.info(f"✅ Извлечено: {len(products)} товаров")
+        if products:
+            await ocr_cache.store(content_hash, phash, raw_text, products)
         return products
     except Exception as e:
         logger.error(f"❌ Ошибка: {e}")
@@ -0,0 +1,115 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import sys
+import time
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from config import WEBHOOK_LISTEN, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def create_web_app(app: Application) -> web.Application:
+    """HTTP-приложение, принимающее апдейты Telegram и передающее их в update_queue бота"""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        update = Update.de_json(data, app.bot)
+        # Обработку выполняет Application с concurrent_updates — ответ Telegram не ждёт хендлеров
+        await app.update_queue.put(update)
+        return web.Response()
+
+    web_app = web.Application()
+    web_app.router.add_post(WEBHOOK_PATH, handle_update)
+    return web_app
+
+
+async def serve_webhook(app: Application):
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+
+    if WEBHOOK_URL:
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        logger.warning("⚠️ WEBHOOK_URL не задан: вебхук в Telegram не регистрируется (локальный режим)")
+
+    runner = web.AppRunner(create_web_app(app))
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"✅ Вебхук слушает {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: остановка через KeyboardInterrupt
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await app.stop()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+        await app.shutdown()
+
+
+def run_webhook(app: Application):
+    try:
+        asyncio.run(serve_webhook(app))
+    except KeyboardInterrupt:
+        pass
+
+
+# --- ЛОКАЛЬНАЯ ПРОВЕРКА: python webhook_server.py updates.jsonl [url] [concurrency] ---
+async def replay_updates(path: str, url: str, concurrency: int = 50):
+    """Отправляет записанные апдейты (по одному JSON на строку) на локальный вебхук"""
+    import aiohttp
+
+    with open(path, "r", encoding="utf-8") as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async def post(session, update):
+        async with semaphore:
+            async with session.post(url, json=update, headers={SECRET_HEADER: WEBHOOK_SECRET}) as resp:
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(post(session, update) for update in updates))
+    elapsed = time.perf_counter() - started
+    print(f"Отправлено: {len(updates)} за {elapsed:.2f} с ({len(updates) / elapsed:.0f} апд/с), статусы: {statuses}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python webhook_server.py updates.jsonl [url] [concurrency]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+    asyncio.run(replay_updates(sys.argv[1], target, int(sys.argv[3]) if len(sys.argv) > 3 else 50))